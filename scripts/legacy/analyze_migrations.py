@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Static lock and rewrite-risk analyzer for pending migrations
+Classifies every statement in supabase/migrations by the table lock it takes,
+whether it rewrites or scans the table, and whether it can run inside the
+migration's transaction. With --db-url, pending files are taken from
+supabase_migrations.schema_migrations and findings are weighted by live
+table sizes.
+
+Usage:
+    python scripts/legacy/analyze_migrations.py
+    python scripts/legacy/analyze_migrations.py --db-url "$DATABASE_URL" --fail-above 200
+"""
+
+import argparse
+import math
+import os
+import re
+import sys
+from pathlib import Path
+
+from migration_sql import Statement, migration_files, psql_rows, split_statements
+from schema_model import IDENT, QNAME, cached_statements, ident, split_top_level
+
+# Lock levels in increasing strength; the weight feeds the risk score.
+LOCK_WEIGHTS = {
+    None: 0,
+    "AccessShareLock": 0,
+    "RowExclusiveLock": 1,
+    "ShareUpdateExclusiveLock": 1,
+    "ShareLock": 3,
+    "ShareRowExclusiveLock": 3,
+    "ExclusiveLock": 4,
+    "AccessExclusiveLock": 5,
+}
+
+INSTANT = "instant"
+SCAN = "scan"
+REWRITE = "rewrite"
+DML = "dml"
+
+TX_OK = "transactional"
+TX_NEVER = "outside-transaction"
+TX_COMMIT_BEFORE_USE = "commit-before-use"
+
+_VOLATILE_DEFAULT = re.compile(
+    r"\bDEFAULT\s+[^,]*\b(random|gen_random_uuid|uuid_generate_v[14]|clock_timestamp|timeofday|nextval)\s*\(",
+    re.IGNORECASE,
+)
+_DDL_IN_BODY = re.compile(
+    r"\b(ALTER\s+TABLE|CREATE\s+(?:UNIQUE\s+)?INDEX|DROP\s+INDEX|CREATE\s+POLICY|ALTER\s+POLICY|DROP\s+POLICY"
+    r"|CREATE\s+(?:OR\s+REPLACE\s+)?(?:CONSTRAINT\s+)?TRIGGER|DROP\s+TRIGGER|DROP\s+TABLE|TRUNCATE"
+    r"|UPDATE\s|DELETE\s+FROM|INSERT\s+INTO|ALTER\s+TYPE)",
+    re.IGNORECASE,
+)
+
+
+class StatementRisk:
+    __slots__ = ("file", "line", "kind", "target", "lock", "work", "transactional", "note", "score")
+
+    def __init__(self, file, line, kind, target=None, lock=None, work=INSTANT, transactional=TX_OK, note=""):
+        self.file = file
+        self.line = line
+        self.kind = kind
+        self.target = target
+        self.lock = lock
+        self.work = work
+        self.transactional = transactional
+        self.note = note
+        self.score = 0.0
+
+
+def _alter_table_action(action: str) -> tuple[str, str, str]:
+    """Return (lock, work, description) for one ALTER TABLE action"""
+    a = " ".join(action.split()).upper()
+    if re.match(r"ADD\s+(CONSTRAINT\s+\S+\s+)?(CHECK|FOREIGN\s+KEY|PRIMARY\s+KEY|UNIQUE|EXCLUDE)\b", a):
+        if "FOREIGN KEY" in a:
+            lock = "ShareRowExclusiveLock"
+        else:
+            lock = "AccessExclusiveLock"
+        if "NOT VALID" in a or "USING INDEX" in a:
+            return lock, INSTANT, "add constraint (no validation)"
+        if "PRIMARY KEY" in a or "UNIQUE" in a or "EXCLUDE" in a:
+            return lock, SCAN, "add constraint (builds index)"
+        return lock, SCAN, "add constraint (validates rows)"
+    if a.startswith("ADD"):
+        if re.search(r"GENERATED\s+ALWAYS\s+AS\s*\(.*\)\s*STORED", a) or _VOLATILE_DEFAULT.search(action):
+            return "AccessExclusiveLock", REWRITE, "add column with volatile/stored value"
+        if "PRIMARY KEY" in a or re.search(r"\bUNIQUE\b", a):
+            return "AccessExclusiveLock", SCAN, "add column with index"
+        return "AccessExclusiveLock", INSTANT, "add column"
+    if a.startswith("VALIDATE CONSTRAINT"):
+        return "ShareUpdateExclusiveLock", SCAN, "validate constraint"
+    if re.match(r"ALTER\s+(COLUMN\s+)?\S+\s+(SET\s+DATA\s+)?TYPE\b", a):
+        return "AccessExclusiveLock", REWRITE, "change column type"
+    if re.match(r"ALTER\s+(COLUMN\s+)?\S+\s+SET\s+NOT\s+NULL", a):
+        return "AccessExclusiveLock", SCAN, "set not null"
+    if re.match(r"ALTER\s+(COLUMN\s+)?\S+\s+SET\s+(STATISTICS|\()", a):
+        return "ShareUpdateExclusiveLock", INSTANT, "column storage settings"
+    if re.match(r"(ENABLE|DISABLE)\s+(ALWAYS\s+|REPLICA\s+)?TRIGGER", a):
+        return "ShareRowExclusiveLock", INSTANT, "toggle trigger"
+    if re.match(r"(SET|RESET)\s*\(", a) or a.startswith("CLUSTER ON") or a.startswith("SET WITHOUT CLUSTER"):
+        return "ShareUpdateExclusiveLock", INSTANT, "storage parameters"
+    if re.match(r"SET\s+(LOGGED|UNLOGGED|TABLESPACE|ACCESS\s+METHOD)", a):
+        return "AccessExclusiveLock", REWRITE, a.split("(")[0].lower()
+    if re.search(r"ROW\s+LEVEL\s+SECURITY", a):
+        return "AccessExclusiveLock", INSTANT, "row level security"
+    return "AccessExclusiveLock", INSTANT, a.split(" ")[0].lower() + " " + (a.split(" ")[1].lower() if " " in a else "")
+
+
+def _worst(results: list[tuple[str, str, str]]) -> tuple[str, str, str]:
+    work_rank = {INSTANT: 0, DML: 1, SCAN: 2, REWRITE: 3}
+    return max(results, key=lambda r: (work_rank[r[1]], LOCK_WEIGHTS[r[0]]))
+
+
+def classify(stmt: Statement, file: str = "") -> list[StatementRisk]:
+    """Classify one statement. DO blocks yield one entry per DDL found in the body."""
+    text = stmt.text
+    flat = " ".join(text.split())
+    upper = flat.upper()
+
+    def risk(kind, target=None, lock=None, work=INSTANT, transactional=TX_OK, note=""):
+        return [StatementRisk(file, stmt.line, kind, target and ident(target), lock, work, transactional, note)]
+
+    if upper.startswith("DO ") or upper == "DO":
+        body = re.search(r"(\$[\w]*\$)(.*)\1", text, re.DOTALL)
+        found = []
+        if body:
+            for inner in split_statements(body.group(2)):
+                match = _DDL_IN_BODY.search(inner.text)
+                if not match:
+                    continue
+                line = stmt.line + text.count("\n", 0, body.start(2)) + inner.line - 1
+                line += inner.text.count("\n", 0, match.start())
+                fragment = Statement(inner.text[match.start():], line)
+                for r in classify(fragment, file):
+                    r.note = (r.note + "; " if r.note else "") + "inside DO block"
+                    found.append(r)
+        return found or risk("do block")
+
+    m = re.match(rf"ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{QNAME}\s+(.*)$", flat, re.IGNORECASE | re.DOTALL)
+    if m:
+        lock, work, desc = _worst([_alter_table_action(a) for a in split_top_level(m.group(2))])
+        if re.match(r"RENAME\b", m.group(2), re.IGNORECASE):
+            desc = "rename"
+        return risk(f"alter table: {desc}", m.group(1), lock, work)
+
+    m = re.match(
+        rf"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(?:{IDENT}\s+)?ON\s+(?:ONLY\s+)?{QNAME}",
+        flat,
+        re.IGNORECASE,
+    )
+    if m:
+        if m.group(1):
+            return risk("create index concurrently", m.group(2), "ShareUpdateExclusiveLock", SCAN, TX_NEVER)
+        return risk("create index", m.group(2), "ShareLock", SCAN)
+
+    m = re.match(rf"DROP\s+INDEX\s+(CONCURRENTLY\s+)?(?:IF\s+EXISTS\s+)?{QNAME}", flat, re.IGNORECASE)
+    if m:
+        if m.group(1):
+            return risk("drop index concurrently", m.group(2), "ShareUpdateExclusiveLock", INSTANT, TX_NEVER)
+        return risk("drop index", m.group(2), "AccessExclusiveLock", INSTANT, note="locks the parent table")
+
+    m = re.match(rf"REINDEX\s+(?:\(.*?\)\s+)?(INDEX|TABLE|SCHEMA|DATABASE)\s+(CONCURRENTLY\s+)?{QNAME}", flat, re.IGNORECASE)
+    if m:
+        if m.group(2):
+            return risk("reindex concurrently", m.group(3), "ShareUpdateExclusiveLock", SCAN, TX_NEVER)
+        return risk("reindex", m.group(3), "ShareLock", SCAN)
+
+    m = re.match(rf"(CREATE|ALTER|DROP)\s+POLICY\s+(?:IF\s+EXISTS\s+)?{IDENT}\s+ON\s+{QNAME}", flat, re.IGNORECASE)
+    if m:
+        return risk(f"{m.group(1).lower()} policy", m.group(2), "AccessExclusiveLock")
+
+    m = re.match(
+        rf"CREATE\s+(?:OR\s+REPLACE\s+)?(?:CONSTRAINT\s+)?TRIGGER\s+{IDENT}\s+.*?\bON\s+{QNAME}", flat, re.IGNORECASE
+    )
+    if m:
+        return risk("create trigger", m.group(1), "ShareRowExclusiveLock")
+
+    m = re.match(rf"DROP\s+TRIGGER\s+(?:IF\s+EXISTS\s+)?{IDENT}\s+ON\s+{QNAME}", flat, re.IGNORECASE)
+    if m:
+        return risk("drop trigger", m.group(1), "AccessExclusiveLock")
+
+    m = re.match(rf"(?:DROP\s+TABLE|TRUNCATE(?:\s+TABLE)?)\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{QNAME}", flat, re.IGNORECASE)
+    if m:
+        return risk(upper.split(" ")[0].lower() + " table", m.group(1), "AccessExclusiveLock")
+
+    m = re.match(r"ALTER\s+TYPE\s+(\S+)\s+ADD\s+VALUE\s+(?:IF\s+NOT\s+EXISTS\s+)?'((?:[^']|'')*)'", flat, re.IGNORECASE)
+    if m:
+        return risk(
+            "alter type add value",
+            m.group(1),
+            transactional=TX_COMMIT_BEFORE_USE,
+            note=f"new value '{m.group(2)}' cannot be used until the transaction commits",
+        )
+
+    m = re.match(r"REFRESH\s+MATERIALIZED\s+VIEW\s+(CONCURRENTLY\s+)?(\S+)", flat, re.IGNORECASE)
+    if m:
+        lock = "ExclusiveLock" if m.group(1) else "AccessExclusiveLock"
+        return risk("refresh materialized view", m.group(2), lock, SCAN)
+
+    m = re.match(rf"CREATE\s+(?:UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?{QNAME}\s*\(", flat, re.IGNORECASE)
+    if m:
+        return risk("create table", m.group(1), note="new table")
+
+    if re.match(r"CREATE\s+MATERIALIZED\s+VIEW", upper) or re.match(r"CREATE\s+(UNLOGGED\s+)?TABLE\s+\S+\s+AS\b", upper):
+        return risk("create table as", None, None, SCAN, note="reads its source query")
+
+    m = re.match(rf"CREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMP\w*\s+)?(?:RECURSIVE\s+)?VIEW\s+{QNAME}", flat, re.IGNORECASE)
+    if m:
+        return risk("create view", m.group(1), "AccessExclusiveLock", note="locks the view only")
+
+    m = re.match(rf"(UPDATE|DELETE\s+FROM|INSERT\s+INTO|MERGE\s+INTO)\s+(?:ONLY\s+)?{QNAME}", flat, re.IGNORECASE)
+    if m:
+        return risk(m.group(1).split(" ")[0].lower(), m.group(2), "RowExclusiveLock", DML, note="row locks on touched rows")
+
+    m = re.match(rf"ALTER\s+PUBLICATION\s+\S+\s+(ADD|DROP|SET)\s+TABLE\s+{QNAME}", flat, re.IGNORECASE)
+    if m:
+        return risk("alter publication", m.group(2), "ShareUpdateExclusiveLock")
+
+    if re.match(r"(VACUUM|CREATE\s+DATABASE|DROP\s+DATABASE|ALTER\s+SYSTEM|CREATE\s+TABLESPACE)\b", upper):
+        return risk(upper.split(" ")[0].lower(), transactional=TX_NEVER)
+
+    if re.match(r"CLUSTER\b", upper):
+        return risk("cluster", None, "AccessExclusiveLock", REWRITE)
+
+    return risk(" ".join(upper.split(" ")[:2]).lower())
+
+
+def analyze_file(path: Path, statements: list[Statement] | None = None) -> list[StatementRisk]:
+    """Classify a migration file and flag enum values used in the same transaction they were added"""
+    statements = statements if statements is not None else cached_statements(path)
+    results = []
+    added = []
+    created = set()
+    for stmt in statements:
+        for value, add in added:
+            if stmt.line > add.line and f"'{value}'" in stmt.text:
+                add.note = f"new value '{value}' is used at line {stmt.line} in the same transaction — split the file"
+                add.score = max(add.score, 100.0)
+        for r in classify(stmt, path.name):
+            if r.kind == "create table":
+                created.add(r.target)
+            elif r.target in created and r.lock:
+                # Nobody else can be using a table created earlier in the same transaction
+                r.lock, r.work, r.note = None, INSTANT, "table created in this migration"
+            results.append(r)
+            if r.transactional == TX_COMMIT_BEFORE_USE:
+                value = re.search(r"'((?:[^']|'')*)'", r.note)
+                if value:
+                    added.append((value.group(1), r))
+    return results
+
+
+def pending_files(db_url: str | None, since: str | None) -> list[Path]:
+    files = migration_files()
+    if since:
+        files = [f for f in files if f.name.split("_")[0] > since]
+    if db_url:
+        applied = {row[0] for row in psql_rows(db_url, "SELECT version FROM supabase_migrations.schema_migrations")}
+        files = [f for f in files if f.name.split("_")[0] not in applied]
+    return files
+
+
+def fetch_table_sizes(db_url: str, tables: set[str]) -> dict[str, tuple[int, int]]:
+    """Fetch (estimated rows, total bytes) for all tables in one query"""
+    if not tables:
+        return {}
+    names = ",".join('"' + t.replace('"', "") + '"' for t in sorted(tables))
+    rows = psql_rows(
+        db_url,
+        f"""
+        SELECT n.nspname || '.' || c.relname, greatest(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+          FROM pg_class c
+          JOIN pg_namespace n ON n.oid = c.relnamespace
+         WHERE c.relkind IN ('r', 'p', 'm')
+           AND n.nspname || '.' || c.relname = ANY('{{{names}}}'::text[])
+        """,
+    )
+    return {r[0]: (int(r[1]), int(r[2])) for r in rows}
+
+
+def score(r: StatementRisk, sizes: dict[str, tuple[int, int]] | None) -> float:
+    """Lock strength times work factor; scans and rewrites grow with table size"""
+    weight = LOCK_WEIGHTS[r.lock]
+    if weight == 0:
+        return r.score
+    megabytes = 0.0
+    if sizes is not None and r.target in sizes:
+        megabytes = sizes[r.target][1] / (1024 * 1024)
+    size_factor = 1 + math.log2(1 + megabytes)
+    # Instant catalog changes still queue behind long-running queries, but only briefly hold the lock
+    factor = {INSTANT: 0.2, DML: size_factor, SCAN: 2 * size_factor, REWRITE: 4 * size_factor}[r.work]
+    return max(r.score, weight * factor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify pending migrations by lock level and rewrite risk")
+    parser.add_argument("--db-url", default=os.getenv("DATABASE_URL"), help="Target database for pending files and sizes")
+    parser.add_argument("--since", help="Only analyze migrations with a version greater than this")
+    parser.add_argument("--all", action="store_true", help="List every statement, not only risky ones")
+    parser.add_argument("--fail-above", type=float, help="Exit non-zero when the deploy score exceeds this")
+    args = parser.parse_args()
+
+    try:
+        files = pending_files(args.db_url, args.since)
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"❌ Could not read applied migrations: {e}")
+        sys.exit(1)
+
+    if not files:
+        print("✅ No pending migrations")
+        sys.exit(0)
+
+    results = [r for f in files for r in analyze_file(f)]
+
+    sizes = None
+    if args.db_url:
+        try:
+            sizes = fetch_table_sizes(args.db_url, {r.target for r in results if r.target})
+        except (RuntimeError, FileNotFoundError) as e:
+            print(f"⚠️ Could not fetch table sizes, scoring without them: {e}")
+
+    for r in results:
+        r.score = score(r, sizes)
+
+    print(f"\n🔍 Analyzed {len(files)} pending migration(s), {len(results)} statement(s)")
+    if sizes is None:
+        print("   (no --db-url: scores assume empty tables)")
+
+    total = 0.0
+    for path in files:
+        file_results = [r for r in results if r.file == path.name]
+        file_score = sum(r.score for r in file_results)
+        total += file_score
+        brief = [r for r in file_results if r.work == INSTANT and r.lock and r.transactional == TX_OK]
+        shown = [r for r in file_results if args.all or (r not in brief and (r.score > 0 or r.transactional != TX_OK))]
+        if not shown and not brief:
+            continue
+        print(f"\n📄 {path.name}  (score {file_score:.0f})")
+        if brief and not args.all:
+            strongest = max(brief, key=lambda r: LOCK_WEIGHTS[r.lock]).lock.replace("Lock", "")
+            tables = len({r.target for r in brief})
+            print(f"   🟡 {len(brief)} brief catalog lock(s) on {tables} table(s), strongest {strongest}")
+        for r in sorted(shown, key=lambda r: -r.score) if not args.all else shown:
+            icon = "🔴" if r.work in (REWRITE, SCAN) and LOCK_WEIGHTS[r.lock] >= 3 else "🟡" if r.score else "⚪"
+            if r.transactional != TX_OK:
+                icon = "⛔"
+            size = ""
+            if sizes and r.target in sizes:
+                rows, total_bytes = sizes[r.target]
+                size = f" [{rows:,} rows, {total_bytes / (1024 * 1024):.1f} MB]"
+            lock = (r.lock or "no table lock").replace("Lock", "")
+            print(f"   {icon} L{r.line:<5} {r.kind:<36} {r.target or '':<44} {lock:<22} {r.work:<8} {r.score:6.1f}{size}")
+            if r.transactional != TX_OK:
+                print(f"          ↳ {r.transactional}: {r.note}")
+            elif r.note and args.all:
+                print(f"          ↳ {r.note}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 Deploy risk score: {total:.0f}")
+    blocking = [r for r in results if r.work in (REWRITE, SCAN) and LOCK_WEIGHTS[r.lock] >= 3]
+    if blocking:
+        print(f"   🔴 {len(blocking)} statement(s) block writes while scanning or rewriting a table")
+    outside = [r for r in results if r.transactional != TX_OK]
+    if outside:
+        print(f"   ⛔ {len(outside)} statement(s) need their own transaction or none at all")
+
+    if args.fail_above is not None and total > args.fail_above:
+        print(f"\n❌ Score {total:.0f} exceeds --fail-above {args.fail_above:g}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
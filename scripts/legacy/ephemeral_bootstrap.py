@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Ephemeral bootstrap for throwaway databases
+Builds a disposable local database from the migrations as fast as correctness
+allows: synchronous_commit is off, maintenance_work_mem is raised for index
+builds, and consecutive migration files share one transaction. A batch is cut
+before files that manage their own transactions or run statements that cannot
+run in one, and after files that add enum values. Seeds are loaded afterwards.
+Refuses to touch anything but a local server.
+"""
+
+import ipaddress
+import json
+import os
+import subprocess
+import time
+import tomllib
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+from analyze_migrations import TX_COMMIT_BEFORE_USE, TX_NEVER, analyze_file
+from migration_sql import (
+    LOCAL_DB_URL,
+    MIGRATIONS_DIR,
+    base_template,
+    drop_database,
+    migration_files,
+    migrations_fingerprint,
+    recreate_database,
+    transaction_units,
+)
+from schema_model import cached_statements
+
+EPHEMERAL_DB = "lekbanken_ephemeral"
+DURABLE_DB = "lekbanken_ephemeral_durable"
+SUPABASE_DIR = MIGRATIONS_DIR.parent
+TIMINGS_PATH = SUPABASE_DIR / ".temp" / "bootstrap-timings.json"
+
+
+# libpq settings that can point a connection at another server than the URL names
+_REDIRECT_ENV = ("PGHOST", "PGHOSTADDR", "PGSERVICE", "PGSERVICEFILE")
+
+
+def local_env(env: dict | None = None) -> dict:
+    """Environment for psql without the variables that could redirect it"""
+    env = dict(os.environ if env is None else env)
+    for name in _REDIRECT_ENV:
+        env.pop(name, None)
+    return env
+
+
+def _strip_port(host: str) -> str:
+    if host.startswith("["):
+        return host[1:host.find("]")]
+    return host.split(":", 1)[0] if host.count(":") == 1 else host
+
+
+def connection_hosts(db_url: str, env: dict | None = None) -> list[str]:
+    """Every host and hostaddr libpq may connect to for this URL.
+
+    Follows libpq: hosts from the URL authority, then the host and hostaddr
+    query parameters, then PGHOST/PGHOSTADDR for whatever the URL leaves out.
+    Multi-host lists are split on commas.
+    """
+    env = os.environ if env is None else env
+    parsed = urlparse(db_url)
+    if parsed.scheme not in ("postgres", "postgresql"):
+        raise ValueError("expected a postgresql:// connection URL")
+    params = parse_qs(parsed.query)
+    if "service" in params:
+        raise ValueError("service= connections cannot be checked for locality")
+
+    authority = unquote(parsed.netloc.rpartition("@")[2])
+    hosts = [_strip_port(h) for h in authority.split(",")]
+    hosts += [h for value in params.get("host", []) for h in value.split(",")]
+    hostaddrs = [a for value in params.get("hostaddr", []) for a in value.split(",")]
+    hosts = [h.strip() for h in hosts if h.strip()]
+    hostaddrs = [a.strip() for a in hostaddrs if a.strip()]
+    if not hosts:
+        hosts = [h for h in env.get("PGHOST", "").split(",") if h]
+    if not hostaddrs:
+        hostaddrs = [a for a in env.get("PGHOSTADDR", "").split(",") if a]
+    return hosts + hostaddrs
+
+
+def _is_local(host: str) -> bool:
+    if host.startswith(("/", "@")) or host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def require_local(db_url: str, env: dict | None = None) -> None:
+    """Raise ValueError unless every host libpq could use is a Unix socket or a loopback address"""
+    remote = [h for h in connection_hosts(db_url, env) if not _is_local(h)]
+    if remote:
+        raise ValueError(f"refusing to bootstrap on non-local host(s) {', '.join(remote)}")
+
+
+def fits_one_transaction(path: Path, risks=None) -> bool:
+    """False for files that manage their own transactions or run statements that cannot run in one"""
+    statements = cached_statements(path)
+    if any(len(unit) > 1 for unit in transaction_units(statements)):
+        return False
+    risks = risks if risks is not None else analyze_file(path, statements)
+    return not any(r.transactional == TX_NEVER for r in risks)
+
+
+def plan_batches(files: list[Path]) -> list[tuple[list[Path], bool]]:
+    """Group files into (files, single_transaction) runs in apply order"""
+    batches = []
+    current = []
+    for path in files:
+        risks = analyze_file(path, cached_statements(path))
+        if not fits_one_transaction(path, risks):
+            if current:
+                batches.append((current, True))
+                current = []
+            batches.append(([path], False))
+            continue
+        current.append(path)
+        if any(r.transactional == TX_COMMIT_BEFORE_USE for r in risks):
+            # New enum values are only usable once this batch commits
+            batches.append((current, True))
+            current = []
+    if current:
+        batches.append((current, True))
+    return batches
+
+
+def seed_files() -> list[Path]:
+    """Seed files from [db.seed] in supabase/config.toml, in configured order"""
+    config = tomllib.loads((SUPABASE_DIR / "config.toml").read_text(encoding="utf-8"))
+    seed = config.get("db", {}).get("seed", {})
+    if not seed.get("enabled", True):
+        return []
+    files = []
+    for pattern in seed.get("sql_paths", []):
+        files.extend(p for p in sorted(SUPABASE_DIR.glob(pattern.removeprefix("./"))) if p not in files)
+    return files
+
+
+def _run_psql(db_url: str, files: list[Path], single_transaction: bool, env: dict) -> None:
+    args = ["psql", db_url, "-X", "-q", "-v", "ON_ERROR_STOP=1"]
+    if single_transaction:
+        args.append("--single-transaction")
+    for i, path in enumerate(files):
+        if i:
+            # Files are normally applied in separate sessions; don't let SET search_path
+            # and friends leak into the next one. PGOPTIONS defaults survive the reset.
+            args += ["-c", "RESET ALL"]
+        args += ["-f", str(path)]
+    result = subprocess.run(args, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[:2000])
+
+
+def apply_durable(db_url: str, files: list[Path]) -> float:
+    """Apply migrations the way the runners do: one fully synced transaction per file"""
+    started = time.perf_counter()
+    for path in files:
+        _run_psql(db_url, [path], fits_one_transaction(path), local_env())
+    return time.perf_counter() - started
+
+
+def apply_ephemeral(db_url: str, files: list[Path], seeds: list[Path], maintenance_work_mem: str) -> float:
+    """Apply migrations in as few transactions as possible, then the seeds"""
+    env = local_env()
+    env["PGOPTIONS"] = " ".join(filter(None, [
+        env.get("PGOPTIONS", ""),
+        "-c synchronous_commit=off",
+        f"-c maintenance_work_mem={maintenance_work_mem}",
+    ]))
+
+    batches = plan_batches(files)
+    print(f"📦 {len(files)} migrations in {len(batches)} runs "
+          f"({sum(1 for _, tx in batches if not tx)} outside a shared transaction)")
+
+    started = time.perf_counter()
+    for i, (batch, single_transaction) in enumerate(batches, 1):
+        label = batch[0].name if len(batch) == 1 else f"{batch[0].name} … {batch[-1].name}"
+        print(f"   [{i}/{len(batches)}] {len(batch)} file(s): {label}")
+        _run_psql(db_url, batch, single_transaction, env)
+    elapsed = time.perf_counter() - started
+
+    if seeds:
+        print(f"🌱 Loading {len(seeds)} seed file(s)")
+        _run_psql(db_url, seeds, True, env)
+    return elapsed
+
+
+def _load_timings() -> dict:
+    try:
+        return json.loads(TIMINGS_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_timings(timings: dict) -> None:
+    TIMINGS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    TIMINGS_PATH.write_text(json.dumps(timings, indent=2), encoding="utf-8")
+
+
+def bootstrap(admin_url: str = LOCAL_DB_URL, database: str = EPHEMERAL_DB, template: str | None = None,
+              seed: bool = True, compare: bool = False, maintenance_work_mem: str = "1GB") -> bool:
+    """Recreate `database` from the migrations in ephemeral mode and report the speedup"""
+    try:
+        require_local(admin_url)
+    except ValueError as e:
+        print(f"❌ {e}. Ephemeral mode turns off durability and is for local throwaway databases only.")
+        return False
+    env = local_env()
+
+    files = migration_files()
+    if not files:
+        print("❌ No migration files found in supabase/migrations/")
+        return False
+
+    seeds = seed_files() if seed else []
+    timings = _load_timings()
+    fingerprint = migrations_fingerprint()
+
+    print(f"\n⚡ Ephemeral bootstrap of {database}")
+    print("=" * 60)
+    try:
+        template = base_template(admin_url, template, env)
+        print(f"🧱 Starting from template {template}")
+        if compare:
+            print(f"🐢 Durable run into {DURABLE_DB} for comparison...")
+            durable_url = recreate_database(admin_url, DURABLE_DB, template, env)
+            try:
+                timings["durable"] = {"fingerprint": fingerprint, "seconds": apply_durable(durable_url, files)}
+            finally:
+                drop_database(admin_url, DURABLE_DB, env)
+
+        db_url = recreate_database(admin_url, database, template, env)
+        elapsed = apply_ephemeral(db_url, files, seeds, maintenance_work_mem)
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"❌ Failed: {e}")
+        return False
+
+    timings["ephemeral"] = {"fingerprint": fingerprint, "seconds": elapsed}
+    _save_timings(timings)
+
+    print("\n" + "=" * 60)
+    print(f"✅ Migrations applied in {elapsed:.1f}s → {db_url}")
+    durable = timings.get("durable")
+    if durable and durable["fingerprint"] == fingerprint:
+        print(f"📊 Durable path: {durable['seconds']:.1f}s → {durable['seconds'] / max(elapsed, 1e-6):.1f}x faster")
+    else:
+        print("📊 No durable timing for these migrations yet; pass --compare to measure one")
+    return True
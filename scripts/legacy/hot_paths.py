@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Hot path report: production stats mapped back to migrations
+Snapshots pg_stat_statements, pg_stat_user_functions and pg_stat_user_tables
+before and after a workload window, computes the deltas and joins each hot
+function and table to the migration file and line that last defined it,
+including the RLS policies and triggers on the tables touched.
+
+Usage:
+    python scripts/legacy/hot_paths.py --db-url "$DATABASE_URL" --seconds 300
+    python scripts/legacy/hot_paths.py --db-url "$DATABASE_URL" --command "npm run test:load" --json hot.json
+
+pg_stat_user_functions only counts calls when track_functions is 'pl' or
+'all' on the server.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from migration_sql import psql_rows
+from schema_model import QNAME, SchemaModel, function_ref, ident, load_model
+
+_FUNCTIONS_SQL = """
+SELECT f.funcid::regprocedure::text, f.calls, f.total_time, f.self_time
+  FROM pg_stat_user_functions f
+"""
+
+_TABLES_SQL = """
+SELECT schemaname || '.' || relname,
+       coalesce(seq_scan, 0), coalesce(seq_tup_read, 0), coalesce(idx_scan, 0), coalesce(idx_tup_fetch, 0),
+       n_tup_ins + n_tup_upd + n_tup_del
+  FROM pg_stat_user_tables
+"""
+
+# One row per (userid, dbid, queryid, toplevel); the same query runs as anon,
+# authenticated and service_role, so aggregate per queryid
+_STATEMENTS_SQL = """
+SELECT queryid, sum(calls), sum(total_exec_time), sum(rows),
+       left(regexp_replace(min(query), '\\s+', ' ', 'g'), 400)
+  FROM {schema}.pg_stat_statements
+ WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+ GROUP BY queryid
+"""
+
+_TABLE_REF = re.compile(rf"\b(?:FROM|JOIN|UPDATE|INTO)\s+{QNAME}", re.IGNORECASE)
+_CALL_REF = re.compile(rf"{QNAME}\s*\(")
+
+
+class Snapshot:
+    def __init__(self, db_url: str, statements_schema: str | None):
+        self.taken_at = time.time()
+        self.functions = {r[0]: (int(r[1]), float(r[2]), float(r[3])) for r in psql_rows(db_url, _FUNCTIONS_SQL)}
+        self.tables = {r[0]: tuple(int(v) for v in r[1:6]) for r in psql_rows(db_url, _TABLES_SQL)}
+        self.statements = {}
+        if statements_schema:
+            for r in psql_rows(db_url, _STATEMENTS_SQL.format(schema=statements_schema)):
+                self.statements[r[0]] = (int(r[1]), float(r[2]), int(r[3]), r[4] if len(r) > 4 else "")
+
+
+def _delta(after: tuple, before: tuple | None) -> tuple:
+    if before is None:
+        return after
+    diff = tuple(a - b if isinstance(a, (int, float)) else a for a, b in zip(after, before))
+    # Counters went backwards: stats were reset during the window
+    if any(isinstance(d, (int, float)) and d < 0 for d in diff):
+        return after
+    return diff
+
+
+def _where(obj) -> str:
+    return f"{obj.file}:{obj.line}" if obj else "not defined in migrations"
+
+
+def _function_definition(model: SchemaModel, regprocedure: str) -> tuple:
+    """(definition, exact); falls back to the last overload of the same name when the signature is unknown"""
+    name, args = function_ref(regprocedure)
+    exact = model.functions.get((name, args))
+    if exact:
+        return exact, True
+    overloads = model.functions_named(name)
+    return (overloads[-1], False) if overloads else (None, False)
+
+
+def _table_context(model: SchemaModel, table: str) -> dict:
+    definition = model.tables.get(table)
+    return {
+        "table": table,
+        "defined_at": _where(definition),
+        "rls": bool(definition and definition.rls),
+        "policies": [
+            {"name": p.name, "command": p.command, "defined_at": _where(p)} for p in model.policies_on(table)
+        ],
+        "triggers": [
+            {"name": t.name, "function": t.function, "defined_at": _where(t)} for t in model.triggers_on(table)
+        ],
+    }
+
+
+def build_report(model: SchemaModel, before: Snapshot, after: Snapshot, top: int) -> dict:
+    functions = []
+    for signature, values in after.functions.items():
+        calls, total, self_time = _delta(values, before.functions.get(signature))
+        if calls <= 0:
+            continue
+        definition, exact = _function_definition(model, signature)
+        functions.append({
+            "function": signature,
+            "calls": calls,
+            "total_ms": round(total, 3),
+            "self_ms": round(self_time, 3),
+            "mean_ms": round(total / calls, 3),
+            "defined_at": _where(definition),
+            "approximate": bool(definition) and not exact,
+            "security_definer": bool(definition and definition.security_definer),
+        })
+    functions.sort(key=lambda f: -f["total_ms"])
+
+    tables = []
+    for table, values in after.tables.items():
+        seq_scan, seq_read, idx_scan, idx_fetch, writes = _delta(values, before.tables.get(table))
+        activity = seq_read + idx_fetch + writes
+        if activity <= 0 and seq_scan + idx_scan <= 0:
+            continue
+        entry = _table_context(model, table)
+        entry.update({
+            "seq_scans": seq_scan,
+            "seq_rows_read": seq_read,
+            "idx_scans": idx_scan,
+            "idx_rows_fetched": idx_fetch,
+            "rows_written": writes,
+            "activity": activity,
+        })
+        tables.append(entry)
+    tables.sort(key=lambda t: -t["activity"])
+
+    statements = []
+    for queryid, values in after.statements.items():
+        calls, total, rows, query = _delta(values, before.statements.get(queryid))
+        if calls <= 0:
+            continue
+        touched = sorted({
+            ident(name) for name in _TABLE_REF.findall(query) if ident(name) in model.tables
+        })
+        called = sorted({
+            ident(name) for name in _CALL_REF.findall(query) if model.functions_named(name)
+        })
+        statements.append({
+            "queryid": queryid,
+            "calls": calls,
+            "total_ms": round(total, 3),
+            "mean_ms": round(total / calls, 3),
+            "rows": rows,
+            "query": query,
+            "tables": [_table_context(model, t) for t in touched],
+            "functions": [
+                {"function": f.signature, "defined_at": _where(f)} for name in called for f in model.functions_named(name)
+            ],
+        })
+    statements.sort(key=lambda s: -s["total_ms"])
+
+    return {
+        "window_seconds": round(after.taken_at - before.taken_at, 1),
+        "functions": functions[:top],
+        "tables": tables[:top],
+        "statements": statements[:top],
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\n🔥 Hot paths over {report['window_seconds']}s")
+
+    print("\n⚙️  Functions (by total time)")
+    if not report["functions"]:
+        print("   (no function calls recorded — is track_functions set to 'pl'?)")
+    for i, f in enumerate(report["functions"], 1):
+        definer = " [security definer]" if f["security_definer"] else ""
+        where = f"{f['defined_at']} (another overload; signature not in migrations)" if f["approximate"] else f["defined_at"]
+        print(f"   {i:2d}. {f['function']}{definer}")
+        print(f"       {f['calls']} calls, {f['total_ms']:.1f} ms total, {f['self_ms']:.1f} ms self, "
+              f"{f['mean_ms']:.2f} ms mean → {where}")
+
+    print("\n📦 Tables (by rows read + written)")
+    for i, t in enumerate(report["tables"], 1):
+        print(f"   {i:2d}. {t['table']} → {t['defined_at']}")
+        print(f"       {t['seq_scans']} seq scans ({t['seq_rows_read']} rows), {t['idx_scans']} index scans "
+              f"({t['idx_rows_fetched']} rows), {t['rows_written']} rows written")
+        for p in t["policies"]:
+            print(f"       🔐 policy {p['name']} ({p['command']}) → {p['defined_at']}")
+        for trg in t["triggers"]:
+            print(f"       ⚡ trigger {trg['name']} → {trg['function']} → {trg['defined_at']}")
+
+    if report["statements"]:
+        print("\n🧾 Statements (by total time)")
+        for i, s in enumerate(report["statements"], 1):
+            print(f"   {i:2d}. {s['calls']} calls, {s['total_ms']:.1f} ms total, {s['mean_ms']:.2f} ms mean")
+            print(f"       {s['query'][:140]}")
+            for f in s["functions"]:
+                print(f"       ⚙️  {f['function']} → {f['defined_at']}")
+            for t in s["tables"]:
+                print(f"       📦 {t['table']} → {t['defined_at']} ({len(t['policies'])} polic{'y' if len(t['policies']) == 1 else 'ies'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Map hot functions and tables back to their migrations")
+    parser.add_argument("--db-url", default=os.getenv("DATABASE_URL"), help="Database to observe")
+    window = parser.add_mutually_exclusive_group()
+    window.add_argument("--seconds", type=float, help="Observe for this many seconds")
+    window.add_argument("--command", help="Run this workload command between the snapshots")
+    parser.add_argument("--top", type=int, default=15, help="Entries per section (default: %(default)s)")
+    parser.add_argument("--json", help="Also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    if not args.db_url:
+        print("❌ No database URL. Pass --db-url or set DATABASE_URL")
+        sys.exit(1)
+
+    model = load_model()
+
+    try:
+        settings = psql_rows(
+            args.db_url,
+            "SELECT current_setting('track_functions'), "
+            "(SELECT n.nspname FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace "
+            "WHERE e.extname = 'pg_stat_statements')",
+        )
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"❌ Connection failed: {e}")
+        sys.exit(1)
+
+    track_functions, statements_schema = settings[0][0], (settings[0][1] if len(settings[0]) > 1 else "") or None
+    if track_functions == "none":
+        print("⚠️  track_functions is 'none'; function stats will be empty (ALTER SYSTEM SET track_functions = 'pl')")
+    if not statements_schema:
+        print("⚠️  pg_stat_statements is not installed; statement stats will be skipped")
+
+    print("📸 Taking first snapshot...")
+    try:
+        before = Snapshot(args.db_url, statements_schema)
+    except RuntimeError as e:
+        print(f"❌ Snapshot failed: {e}")
+        sys.exit(1)
+
+    if args.command:
+        print(f"🏃 Running workload: {args.command}")
+        subprocess.run(args.command, shell=True)
+    elif args.seconds is not None:
+        print(f"⏳ Observing for {args.seconds:g}s...")
+        time.sleep(args.seconds)
+    else:
+        input("⏳ Run the workload now, then press Enter to take the second snapshot...")
+
+    print("📸 Taking second snapshot...")
+    try:
+        after = Snapshot(args.db_url, statements_schema)
+    except RuntimeError as e:
+        print(f"❌ Snapshot failed after the workload ran: {e}")
+        sys.exit(1)
+
+    report = build_report(model, before, after, args.top)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📝 JSON report: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Lock watchdog for migration runs
+Polls pg_stat_activity / pg_locks on a separate psql session while a
+migration executes, reports who blocks whom, and can cancel the migration
+statement when application queries pile up behind its locks.
+"""
+
+import os
+import subprocess
+import threading
+import time
+
+MIGRATION_APP_NAME = "lekbanken-migration"
+WATCHDOG_APP_NAME = "lekbanken-migration-watchdog"
+
+_SENTINEL = "__lock_watchdog_end__"
+
+# One row per (waiting pid, blocking pid) edge.
+_BLOCKING_SQL = f"""
+SELECT w.pid,
+       coalesce(nullif(w.application_name, ''), w.usename, '?'),
+       b.pid,
+       coalesce(nullif(b.application_name, ''), b.usename, '?'),
+       extract(epoch FROM clock_timestamp() - coalesce(w.query_start, w.state_change))::int,
+       left(regexp_replace(coalesce(w.query, ''), '\\s+', ' ', 'g'), 80)
+  FROM pg_stat_activity w
+  CROSS JOIN LATERAL unnest(pg_blocking_pids(w.pid)) AS blocker(pid)
+  JOIN pg_stat_activity b ON b.pid = blocker.pid
+ WHERE w.wait_event_type = 'Lock'
+   AND w.application_name <> '{WATCHDOG_APP_NAME}';
+"""
+
+# Strong relation locks held or requested by the migration session.
+_MIGRATION_LOCKS_SQL = f"""
+SELECT l.pid,
+       l.mode,
+       l.granted,
+       coalesce(c.relnamespace::regnamespace::text || '.' || c.relname, l.locktype)
+  FROM pg_locks l
+  JOIN pg_stat_activity a ON a.pid = l.pid
+  LEFT JOIN pg_class c ON c.oid = l.relation
+ WHERE a.application_name = '{MIGRATION_APP_NAME}'
+   AND l.locktype = 'relation'
+   AND l.mode IN ('ShareLock', 'ShareRowExclusiveLock', 'ExclusiveLock', 'AccessExclusiveLock')
+ ORDER BY l.granted, c.relname;
+"""
+
+_CANCEL_SQL = f"""
+SELECT pg_cancel_backend(pid)
+  FROM pg_stat_activity
+ WHERE application_name = '{MIGRATION_APP_NAME}'
+   AND state = 'active';
+"""
+
+
+class BlockingEdge:
+    __slots__ = ("waiter_pid", "waiter_app", "blocker_pid", "blocker_app", "wait_seconds", "query")
+
+    def __init__(self, waiter_pid, waiter_app, blocker_pid, blocker_app, wait_seconds, query):
+        self.waiter_pid = waiter_pid
+        self.waiter_app = waiter_app
+        self.blocker_pid = blocker_pid
+        self.blocker_app = blocker_app
+        self.wait_seconds = wait_seconds
+        self.query = query
+
+    @property
+    def app_waits_on_migration(self) -> bool:
+        return self.blocker_app == MIGRATION_APP_NAME and self.waiter_app != MIGRATION_APP_NAME
+
+    @property
+    def migration_waits_on_app(self) -> bool:
+        return self.waiter_app == MIGRATION_APP_NAME and self.blocker_app != MIGRATION_APP_NAME
+
+
+class LockWatchdog(threading.Thread):
+    """Background thread that watches lock contention caused by a migration.
+
+    The migration's psql session must run with application_name set to
+    MIGRATION_APP_NAME (use migration_env()). Auto-cancel is disabled unless
+    cancel_waiters is given: once that many application sessions have been
+    waiting on the migration for cancel_after seconds in a row, the
+    migration's active statement is cancelled with pg_cancel_backend().
+    """
+
+    def __init__(
+        self,
+        psql_args: list[str],
+        env: dict | None = None,
+        interval: float = 1.0,
+        cancel_waiters: int | None = None,
+        cancel_after: float = 10.0,
+        log=print,
+    ):
+        super().__init__(name="lock-watchdog", daemon=True)
+        self.psql_args = psql_args
+        self.env = dict(env if env is not None else os.environ)
+        self.env["PGAPPNAME"] = WATCHDOG_APP_NAME
+        self.interval = interval
+        self.cancel_waiters = cancel_waiters
+        self.cancel_after = cancel_after
+        self.log = log
+        self.max_waiters = 0
+        self.cancelled = False
+        self.error = None
+        self._stop_event = threading.Event()
+        self._proc = None
+        self._over_since = None
+        self._last_report = None
+
+    def _open(self):
+        self._proc = subprocess.Popen(
+            [*self.psql_args, "-X", "-q", "-A", "-t", "-F", "\t", "-v", "ON_ERROR_STOP=0"],
+            env=self.env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+
+    def _query(self, sql: str) -> list[list[str]]:
+        self._proc.stdin.write(f"{sql}\n\\echo {_SENTINEL}\n")
+        self._proc.stdin.flush()
+        rows = []
+        for line in self._proc.stdout:
+            line = line.rstrip("\n")
+            if line == _SENTINEL:
+                return rows
+            if line:
+                rows.append(line.split("\t"))
+        raise RuntimeError("watchdog psql session ended unexpectedly")
+
+    def poll(self) -> tuple[list[BlockingEdge], list[list[str]]]:
+        edges = [
+            BlockingEdge(int(r[0]), r[1], int(r[2]), r[3], int(r[4] or 0), r[5] if len(r) > 5 else "")
+            for r in self._query(_BLOCKING_SQL)
+            if len(r) >= 5
+        ]
+        locks = self._query(_MIGRATION_LOCKS_SQL)
+        return edges, locks
+
+    def _report(self, edges: list[BlockingEdge], locks: list[list[str]]):
+        app_waiters = {e.waiter_pid for e in edges if e.app_waits_on_migration}
+        self.max_waiters = max(self.max_waiters, len(app_waiters))
+
+        relevant = [e for e in edges if e.app_waits_on_migration or e.migration_waits_on_app]
+        # Only log when the blocking graph changes, not on every poll
+        key = frozenset((e.waiter_pid, e.blocker_pid) for e in relevant)
+        if relevant and key != self._last_report:
+            held = ", ".join(f"{r[1]} on {r[3]}" + ("" if r[2] == "t" else " (waiting)") for r in locks)
+            lines = [f"   ⚠️ {len(app_waiters)} app session(s) waiting on migration locks" + (f" [{held}]" if held else "")]
+            for edge in relevant:
+                lines.append(
+                    f"   🔒 pid {edge.waiter_pid} ({edge.waiter_app}) waits on pid {edge.blocker_pid} "
+                    f"({edge.blocker_app}) for {edge.wait_seconds}s: {edge.query}"
+                )
+            self.log("\n".join(lines))
+        self._last_report = key if relevant else None
+        return len(app_waiters)
+
+    def _maybe_cancel(self, waiters: int):
+        if self.cancel_waiters is None or self.cancelled:
+            return
+        now = time.monotonic()
+        if waiters < self.cancel_waiters:
+            self._over_since = None
+            return
+        if self._over_since is None:
+            self._over_since = now
+        elif now - self._over_since >= self.cancel_after:
+            self.log(
+                f"   🛑 {waiters} app session(s) blocked for {now - self._over_since:.0f}s "
+                f"(limit {self.cancel_waiters} for {self.cancel_after:g}s) — cancelling migration statement"
+            )
+            self._query(_CANCEL_SQL)
+            self.cancelled = True
+
+    def run(self):
+        try:
+            self._open()
+            while not self._stop_event.is_set():
+                edges, locks = self.poll()
+                self._maybe_cancel(self._report(edges, locks))
+                self._stop_event.wait(self.interval)
+        except Exception as e:
+            self.error = e
+            self.log(f"   ⚠️ Lock watchdog stopped: {e}")
+        finally:
+            self._close()
+
+    def _close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=5)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=10)
+
+
+def migration_env(env: dict) -> dict:
+    """Return a copy of env that tags the migration session for the watchdog"""
+    env = dict(env)
+    env["PGAPPNAME"] = MIGRATION_APP_NAME
+    return env
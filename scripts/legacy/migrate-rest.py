@@ -1,22 +1,38 @@
 #!/usr/bin/env python3
 """
-Supabase Migration Executor via REST API
-Uses the Supabase REST API to execute migrations
+Supabase Migration Executor via HTTP
+Sends migrations to an SQL-execution endpoint (Supabase Management API by
+default) for environments that cannot reach Postgres on port 5432. Applied
+versions are read from and recorded in supabase_migrations.schema_migrations,
+so only pending migrations run.
+
+Usage:
+    python scripts/legacy/migrate-rest.py --project-ref abcdefghijklmnop
+    python scripts/legacy/migrate-rest.py --endpoint http://127.0.0.1:8787/v1/projects/local/database/query
 """
 
+import argparse
 import os
 import sys
-import json
+import time
+from getpass import getpass
 from pathlib import Path
-import urllib.request
-import urllib.error
 from urllib.parse import urlparse
 
-def main():
-    print("\n🔄 Supabase Migration Executor (REST API)\n")
-    
-    # Get project info
-    project_ref = os.getenv("SUPABASE_PROJECT_REF") or os.getenv("SUPABASE_PROJECT_ID")
+from migration_sql import MIGRATIONS_DIR, migration_files, read_statements
+from sql_http import (
+    DEFAULT_MAX_BATCH_BYTES,
+    MANAGEMENT_API_URL,
+    REQUEST_ERRORS,
+    SqlHttpClient,
+    describe_batches,
+    execute_file,
+    pending_files,
+)
+
+
+def _resolve_project_ref(cli_ref: str | None) -> str | None:
+    project_ref = cli_ref or os.getenv("SUPABASE_PROJECT_REF") or os.getenv("SUPABASE_PROJECT_ID")
     if not project_ref:
         supabase_url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
         if supabase_url:
@@ -24,82 +40,117 @@ def main():
                 project_ref = urlparse(supabase_url).hostname.split(".")[0]
             except Exception:
                 project_ref = None
+    return project_ref
 
-    if not project_ref:
-        project_ref = input("Enter Supabase project ref (e.g. abcdefghijklmnop): ").strip() or None
-
-    print("📍 Get your credentials from:")
-    print("https://supabase.com/dashboard → your project → Settings → API\n")
-    
-    service_role_key = input("Enter your Service Role Key: ").strip()
-    
-    if not service_role_key:
-        print("❌ No API key provided")
+
+def main():
+    parser = argparse.ArgumentParser(description="Execute Supabase migrations over HTTP")
+    parser.add_argument("--project-ref", help="Supabase project ref (or set SUPABASE_PROJECT_REF)")
+    parser.add_argument("--endpoint", help="SQL-execution endpoint URL (overrides the Management API URL)")
+    parser.add_argument("--max-batch-kb", type=int, default=DEFAULT_MAX_BATCH_BYTES // 1024,
+                        help="Maximum SQL size per request in KiB (default: %(default)s)")
+    parser.add_argument("--no-gzip", action="store_true", help="Send request bodies uncompressed")
+    parser.add_argument("--dry-run", action="store_true", help="Show how files would be batched and exit")
+    parser.add_argument("--yes", action="store_true", help="Do not ask for confirmation")
+    parser.add_argument("--migrations-dir", type=Path, default=MIGRATIONS_DIR,
+                        help="Directory of migration files (default: supabase/migrations)")
+    args = parser.parse_args()
+
+    print("\n🔄 Supabase Migration Executor (HTTP)\n")
+
+    max_batch_bytes = args.max_batch_kb * 1024
+    files = migration_files(args.migrations_dir)
+    if not files:
+        print("❌ No migration files found")
         sys.exit(1)
-    
-    print("\n🧪 Testing connection...")
-    
-    if not project_ref:
-        print("❌ Missing project ref. Set SUPABASE_PROJECT_REF or SUPABASE_URL")
+
+    print(f"📄 Found {len(files)} migrations\n")
+
+    if args.dry_run:
+        for i, migration_file in enumerate(files, 1):
+            batches = describe_batches(read_statements(migration_file), max_batch_bytes)
+            sizes = ", ".join(f"{count} stmts/{size // 1024} KiB" for count, size in batches)
+            print(f"   {i:2d}. {migration_file.name}: {len(batches)} request(s) [{sizes}]")
+        sys.exit(0)
+
+    endpoint = args.endpoint or os.getenv("SUPABASE_SQL_ENDPOINT")
+    if not endpoint:
+        project_ref = _resolve_project_ref(args.project_ref)
+        if not project_ref:
+            project_ref = input("Enter Supabase project ref (e.g. abcdefghijklmnop): ").strip() or None
+        if not project_ref:
+            print("❌ Missing project ref. Set SUPABASE_PROJECT_REF or SUPABASE_URL")
+            sys.exit(1)
+        endpoint = MANAGEMENT_API_URL.format(ref=project_ref)
+
+    token = os.getenv("SUPABASE_ACCESS_TOKEN")
+    if not token:
+        print("📍 Create a personal access token at:")
+        print("https://supabase.com/dashboard/account/tokens\n")
+        token = getpass("Enter your Supabase access token: ").strip()
+
+    if not token:
+        print("❌ No access token provided")
         sys.exit(1)
 
-    url = f"https://{project_ref}.supabase.co/rest/v1/health"
-    headers = {
-        'Authorization': f'Bearer {service_role_key}',
-        'Content-Type': 'application/json'
-    }
-    
+    client = SqlHttpClient(endpoint, token, use_gzip=not args.no_gzip)
+
+    print("\n🧪 Testing connection...")
     try:
-        req = urllib.request.Request(url, headers=headers, method='GET')
-        with urllib.request.urlopen(req) as response:
-            print("✅ Connection successful\n")
-    except urllib.error.URLError as e:
+        client.execute("select 1")
+        print("✅ Connection successful\n")
+    except Exception as e:
         print(f"❌ Connection failed: {e}")
+        client.close()
         sys.exit(1)
-    
-    # Find migrations
-    migrations_dir = Path(__file__).parent.parent / "supabase" / "migrations"
-    migration_files = sorted(migrations_dir.glob("*.sql"))
-    
-    if not migration_files:
-        print("❌ No migration files found")
+
+    try:
+        pending = pending_files(client, files)
+    except REQUEST_ERRORS as e:
+        print(f"❌ Could not read the migration history: {e}")
+        client.close()
         sys.exit(1)
-    
-    print(f"📄 Found {len(migration_files)} migrations\n")
-    
-    # Confirm
-    confirm = input("Execute all migrations? (y/n): ").strip().lower()
-    if confirm != 'y':
-        print("Cancelled")
+
+    print(f"📋 {len(files) - len(pending)} already applied, {len(pending)} pending")
+    if not pending:
+        print("✅ Database is up to date")
+        client.close()
         sys.exit(0)
-    
+
+    if not args.yes:
+        confirm = input(f"Execute {len(pending)} pending migration(s)? (y/n): ").strip().lower()
+        if confirm != 'y':
+            print("Cancelled")
+            client.close()
+            sys.exit(0)
+
     print("\n⏳ Executing migrations...\n")
-    
+
+    started = time.perf_counter()
     success = 0
     failed = 0
-    
-    for i, migration_file in enumerate(migration_files, 1):
-        print(f"[{i}/{len(migration_files)}] {migration_file.name}...", end=" ", flush=True)
-        
-        try:
-            # Read migration SQL
-            with open(migration_file, 'r', encoding='utf-8') as f:
-                sql = f.read()
-            
-            # Execute via RPC call to a function or direct query
-            # Note: This requires a POST to /rest/v1/rpc/exec_sql or similar
-            # For now, we'll just show what would be executed
-            print("⏳")
-            success += 1
-        except Exception as e:
-            print("❌")
-            print(f"   Error: {str(e)[:100]}")
-            failed += 1
-    
-    print(f"\n📝 Note: REST API execution requires function setup in Supabase")
-    print(f"✅ Migrations verified: {success} files found\n")
-    print("Recommended: Use Supabase Dashboard SQL Editor instead")
-    print("See: QUICK_SOLUTION.md\n")
+
+    with client:
+        for i, migration_file in enumerate(pending, 1):
+            print(f"[{i}/{len(pending)}] {migration_file.name}...", end=" ", flush=True)
+            result = execute_file(client, migration_file, max_batch_bytes, record_version=True)
+            if result.ok:
+                print(f"✅ ({result.statements} stmts, {result.batches} req, {result.seconds:.2f}s)")
+                success += 1
+            else:
+                print("❌")
+                print(f"   Error: {result.error[:300]}")
+                print(f"\n⚠️ Stopping at migration {i}. Fix the error and retry; applied migrations are skipped.")
+                failed += 1
+                break
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Done: {success} succeeded, {failed} failed in {elapsed:.1f}s")
+    print(f"📡 {client.requests_sent} requests, {client.bytes_sent // 1024} KiB sent, "
+          f"{client.connections_opened} connection(s) opened\n")
+
+    sys.exit(0 if failed == 0 else 1)
+
 
 if __name__ == "__main__":
     main()
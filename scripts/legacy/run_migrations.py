@@ -2,8 +2,20 @@
 """
 Run all Supabase migrations in order
 Uses psql directly with subprocess
+
+A lock watchdog runs alongside each migration and reports application
+sessions blocked by it. Pass --cancel-waiters to cancel a migration
+statement automatically when too many sessions pile up behind it:
+
+    python scripts/legacy/run_migrations.py --cancel-waiters 5 --cancel-after 10
+
+For throwaway local databases (CI, tests), --ephemeral skips the durable path
+and rebuilds a scratch database with durability off and batched transactions:
+
+    python scripts/legacy/run_migrations.py --ephemeral --compare
 """
 
+import argparse
 import os
 import subprocess
 import sys
@@ -11,6 +23,9 @@ from pathlib import Path
 from getpass import getpass
 import re
 
+from ephemeral_bootstrap import EPHEMERAL_DB, LOCAL_DB_URL, bootstrap, fits_one_transaction
+from lock_watchdog import LockWatchdog, migration_env
+
 
 def _resolve_project_ref() -> str | None:
     project_ref = os.getenv("SUPABASE_PROJECT_REF") or os.getenv("SUPABASE_PROJECT_ID")
@@ -26,7 +41,7 @@ def _resolve_project_ref() -> str | None:
 
     return None
 
-def run_migrations():
+def run_migrations(watch_locks: bool = True, cancel_waiters: int | None = None, cancel_after: float = 10.0):
     # Supabase connection details
     project_ref = _resolve_project_ref()
     host = os.getenv("SUPABASE_DB_HOST")
@@ -65,21 +80,38 @@ def run_migrations():
             env = os.environ.copy()
             env["PGPASSWORD"] = password
             
-            result = subprocess.run(
-                [
-                    "psql",
-                    "-h", host,
-                    "-p", port,
-                    "-U", user,
-                    "-d", database,
-                    "-f", str(migration_file)
-                ],
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            
+            psql_args = ["psql", "-h", host, "-p", port, "-U", user, "-d", database]
+
+            watchdog = None
+            if watch_locks:
+                watchdog = LockWatchdog(psql_args, env=env, cancel_waiters=cancel_waiters, cancel_after=cancel_after)
+                watchdog.start()
+            # One transaction per file, so an error or a watchdog cancel rolls the whole file back.
+            # Files with their own BEGIN/COMMIT or CONCURRENTLY statements run as written.
+            single_transaction = ["--single-transaction"] if fits_one_transaction(migration_file) else []
+            try:
+                result = subprocess.run(
+                    [*psql_args, "-v", "ON_ERROR_STOP=1", *single_transaction, "-f", str(migration_file)],
+                    env=migration_env(env),
+                    capture_output=True,
+                    text=True,
+                    timeout=300
+                )
+            finally:
+                if watchdog:
+                    watchdog.stop()
+
+            if watchdog and watchdog.max_waiters:
+                print(f"🔒 Peak app sessions waiting on this migration: {watchdog.max_waiters}")
+
+            if watchdog and watchdog.cancelled:
+                print(f"🛑 Cancelled by lock watchdog")
+                print(result.stderr)
+                if single_transaction:
+                    print("↩️  The migration was rolled back; nothing from this file was applied.")
+                print(f"\n⚠️ Stopping at migration {i}. Reschedule it for a quieter window or make it lock less.")
+                return False
+
             if result.returncode == 0:
                 print(f"✅ Success")
                 if result.stdout.strip():
@@ -106,5 +138,39 @@ def run_migrations():
     return True
 
 if __name__ == "__main__":
-    success = run_migrations()
+    parser = argparse.ArgumentParser(description="Run all Supabase migrations in order")
+    parser.add_argument("--no-watchdog", action="store_true", help="Do not watch for lock contention")
+    parser.add_argument("--cancel-waiters", type=int,
+                        help="Cancel the migration statement when this many app sessions wait on it")
+    parser.add_argument("--cancel-after", type=float, default=10.0,
+                        help="Seconds the waiter threshold must be exceeded before cancelling (default: %(default)s)")
+    ephemeral = parser.add_argument_group("ephemeral mode (local throwaway databases only)")
+    ephemeral.add_argument("--ephemeral", action="store_true",
+                           help="Rebuild a scratch database fast, without durability")
+    ephemeral.add_argument("--db-url", default=os.getenv("DATABASE_URL", LOCAL_DB_URL),
+                           help="Local server to build on (default: %(default)s)")
+    ephemeral.add_argument("--database", default=EPHEMERAL_DB, help="Database to (re)create (default: %(default)s)")
+    ephemeral.add_argument("--base-template",
+                           help="Database to start from; must have the Supabase schemas "
+                                "(default: build lekbanken_supabase_base from the local stack)")
+    ephemeral.add_argument("--maintenance-work-mem", default="1GB", help="For index builds (default: %(default)s)")
+    ephemeral.add_argument("--no-seed", action="store_true", help="Do not load seeds from supabase/config.toml")
+    ephemeral.add_argument("--compare", action="store_true",
+                           help="Also time the durable path in a second scratch database")
+    args = parser.parse_args()
+    if args.ephemeral:
+        success = bootstrap(
+            admin_url=args.db_url,
+            database=args.database,
+            template=args.base_template,
+            seed=not args.no_seed,
+            compare=args.compare,
+            maintenance_work_mem=args.maintenance_work_mem,
+        )
+        sys.exit(0 if success else 1)
+    success = run_migrations(
+        watch_locks=not args.no_watchdog,
+        cancel_waiters=args.cancel_waiters,
+        cancel_after=args.cancel_after,
+    )
     sys.exit(0 if success else 1)
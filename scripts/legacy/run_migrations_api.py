@@ -1,66 +1,73 @@
 #!/usr/bin/env python3
 """
-Run all Supabase migrations using the Supabase API
+Run pending Supabase migrations using the Supabase Management API
+Applied versions are tracked in supabase_migrations.schema_migrations.
 """
-import requests
-import json
-from pathlib import Path
+import os
 import sys
 from getpass import getpass
 
+from migration_sql import migration_files
+from sql_http import MANAGEMENT_API_URL, REQUEST_ERRORS, SqlHttpClient, execute_file, pending_files
+
+
 def run_migrations():
     # Configuration
-    # Get API key from user
-    api_key = getpass("Enter your Supabase API key (from Settings → API → Project API Keys): ")
-    
+    endpoint = os.getenv("SUPABASE_SQL_ENDPOINT")
+    if not endpoint:
+        project_ref = os.getenv("SUPABASE_PROJECT_REF") or input("Enter Supabase project ref: ").strip()
+        if not project_ref:
+            print("❌ Missing project ref. Set SUPABASE_PROJECT_REF or SUPABASE_SQL_ENDPOINT")
+            sys.exit(1)
+        endpoint = MANAGEMENT_API_URL.format(ref=project_ref)
+
+    # Get access token from user
+    api_key = os.getenv("SUPABASE_ACCESS_TOKEN") or getpass(
+        "Enter your Supabase access token (from Account → Access Tokens): "
+    )
+
     # Get migration files
-    migrations_dir = Path(__file__).parent.parent / "supabase" / "migrations"
-    migration_files = sorted(migrations_dir.glob("*.sql"))
-    
-    if not migration_files:
+    files = migration_files()
+
+    if not files:
         print("No migration files found!")
         sys.exit(1)
-    
-    print(f"\nFound {len(migration_files)} migration files")
+
+    print(f"\nFound {len(files)} migration files")
     print("=" * 70)
-    
+
     failed_count = 0
     success_count = 0
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    for migration_file in migration_files:
-        print(f"\n▶ Executing: {migration_file.name}")
-        
+
+    with SqlHttpClient(endpoint, api_key) as client:
         try:
-            # Read SQL file
-            with open(migration_file, 'r', encoding='utf-8') as f:
-                sql_content = f.read()
-            
-            # For now, we'll just print instructions since direct API execution requires the SQL editor
-            print(f"   File size: {len(sql_content)} bytes")
-            print(f"   Please run this manually via Supabase Dashboard SQL Editor")
-            print(f"   or wait for setup completion...")
-            success_count += 1
-            
-        except Exception as e:
-            print(f"❌ ERROR: {str(e)}")
-            failed_count += 1
-    
+            pending = pending_files(client, files)
+        except REQUEST_ERRORS as e:
+            print(f"❌ Could not read the migration history: {e}")
+            sys.exit(1)
+        print(f"{len(files) - len(pending)} already applied, {len(pending)} pending")
+
+        for migration_file in pending:
+            print(f"\n▶ Executing: {migration_file.name}")
+
+            result = execute_file(client, migration_file, record_version=True)
+            if result.ok:
+                print(f"✅ SUCCESS ({result.statements} statements in {result.batches} request(s), {result.seconds:.2f}s)")
+                success_count += 1
+            else:
+                print(f"❌ ERROR: {result.error}")
+                failed_count += 1
+                break
+
     # Summary
     print("\n" + "=" * 70)
-    print(f"\n📊 MIGRATIONS READY:")
-    print(f"   📋 Total: {len(migration_files)}")
-    print(f"\n💡 RECOMMENDED METHOD:")
-    print("   1. Go to: https://supabase.com/dashboard → your project → SQL Editor")
-    print(f"   2. Copy & paste each SQL file from supabase/migrations/")
-    print(f"   3. Execute in order (00 → 13)")
-    print(f"\n📝 Files to execute:")
-    for i, f in enumerate(migration_files, 1):
-        print(f"   {i:2d}. {f.name}")
+    print(f"\n📊 MIGRATION RESULTS:")
+    print(f"   ✅ Success: {success_count}/{len(pending)}")
+    print(f"   ❌ Failed:  {failed_count}/{len(pending)}")
+    print(f"   📡 Requests: {client.requests_sent} over {client.connections_opened} connection(s)")
+
+    if failed_count:
+        sys.exit(1)
 
 if __name__ == "__main__":
     run_migrations()
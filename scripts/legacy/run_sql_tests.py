@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Parallel runner for SQL test files
+Discovers supabase/tests/*.sql, supabase/verify_rls_coverage.sql and the
+automated tests/rls/*.test.sql harnesses, clones a migrated template database
+once per worker and runs the files in parallel processes. RAISE NOTICE / RAISE EXCEPTION / ASSERT output is parsed into
+pass/fail results and written as JUnit XML.
+
+Usage:
+    supabase db reset
+    python scripts/legacy/run_sql_tests.py --workers 4 --junit test-results/sql-tests.xml
+
+The template is built from --source-db (the local database that
+`supabase db reset` migrated) with pg_dump/pg_restore and reused until that
+database's migration history changes.
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from migration_sql import (
+    LOCAL_DB_URL,
+    db_url_for,
+    drop_database,
+    dump_into,
+    psql_rows,
+    recreate_database,
+    split_statements,
+    transaction_units,
+)
+
+REPO_ROOT = Path(__file__).parent.parent.parent
+SUPABASE_DIR = REPO_ROOT / "supabase"
+RLS_TESTS_DIR = REPO_ROOT / "tests" / "rls"
+TEMPLATE_DB = "lekbanken_sqltest_template"
+WORKER_DB_PREFIX = "lekbanken_sqltest_w"
+
+# psql prefixes server messages with "psql:<file>:<line>: "
+_MESSAGE = re.compile(r"^(?:psql:[^:]*:(?P<line>\d+):\s*)?(?P<level>NOTICE|WARNING|ERROR|FATAL):\s+(?P<text>.*)$")
+# Cases may carry a status mark, as in the tests/rls harnesses: "✓ TEST 1 PASSED: …"
+_CASE = re.compile(
+    r"^(?:[✓✗⊘]\s*)?(?P<name>TEST\s+[\w.-]+)\s+(?P<result>PASSED|FAILED|SKIPPED)\b:?\s*(?P<detail>.*)$",
+    re.IGNORECASE,
+)
+# tests/rls also holds manual scripts meant for the SQL editor; only files that report cases are run
+_REPORTS_CASES = re.compile(r"RAISE\s+NOTICE\s+'[^']*TEST\s+[\w.-]+\s+PASSED", re.IGNORECASE)
+_META_COMMAND = re.compile(r"^\s*\\.*$", re.MULTILINE)
+_READ_ONLY = re.compile(r"^(SELECT|SHOW|SET|RESET|VALUES|TABLE|EXPLAIN)\b", re.IGNORECASE)
+_WRITE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+def discover_tests(patterns: list[str] | None = None) -> list[Path]:
+    files = sorted((SUPABASE_DIR / "tests").rglob("*.sql"))
+    coverage = SUPABASE_DIR / "verify_rls_coverage.sql"
+    if coverage.exists():
+        files.append(coverage)
+    files += [
+        f for f in sorted(RLS_TESTS_DIR.glob("*.test.sql"))
+        if _REPORTS_CASES.search(f.read_text(encoding="utf-8"))
+    ]
+    if patterns:
+        files = [f for f in files if any(p in f.name for p in patterns)]
+    return files
+
+
+def source_fingerprint(admin_url: str, source_db: str) -> str:
+    """Hash of the migrations recorded in the source database, which is what the template is dumped from"""
+    rows = psql_rows(
+        db_url_for(admin_url, source_db),
+        "SELECT count(*) || '-' || md5(coalesce(string_agg("
+        "version || ':' || coalesce(array_to_string(statements, ';'), ''), ',' ORDER BY version), '')) "
+        "FROM supabase_migrations.schema_migrations",
+    )
+    return rows[0][0]
+
+
+def ensure_template(admin_url: str, source_db: str, rebuild: bool) -> None:
+    """Build the template database from the migrated source unless it is current"""
+    fingerprint = f"lekbanken-sqltest {source_fingerprint(admin_url, source_db)}"
+    rows = psql_rows(
+        admin_url,
+        f"SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = '{TEMPLATE_DB}'",
+    )
+    if rows and rows[0][0] == fingerprint and not rebuild:
+        print(f"♻️  Reusing template {TEMPLATE_DB}")
+        return
+
+    print(f"🏗️  Building template {TEMPLATE_DB} from {source_db}...")
+    started = time.perf_counter()
+    recreate_database(admin_url, TEMPLATE_DB)
+
+    allowed, unexpected = dump_into(admin_url, source_db, TEMPLATE_DB)
+    if allowed:
+        print(f"   ⚠️ Ignored {len(allowed)} restore error(s) for Supabase-managed objects")
+    if unexpected:
+        # Never stamp a partial template: it would be reused until the source is migrated again
+        for error in unexpected:
+            print(f"   ❌ {error}")
+        drop_database(admin_url, TEMPLATE_DB)
+        raise RuntimeError(f"pg_restore into {TEMPLATE_DB} reported {len(unexpected)} unexpected error(s)")
+
+    psql_rows(admin_url, f"COMMENT ON DATABASE \"{TEMPLATE_DB}\" IS '{fingerprint}'")
+    print(f"   ✅ Template ready in {time.perf_counter() - started:.1f}s")
+
+
+def leaves_state(path: Path) -> bool:
+    """True when a file may commit changes, i.e. anything outside a BEGIN … ROLLBACK block writes"""
+    # psql meta-commands (\set, \echo) are not SQL; blank them so they don't merge into the next statement
+    sql = _META_COMMAND.sub("", path.read_text(encoding="utf-8"))
+    for unit in transaction_units(split_statements(sql)):
+        if len(unit) > 1:
+            if not unit[-1].text.upper().startswith("ROLLBACK"):
+                return True
+        elif not _READ_ONLY.match(unit[0].text) or _WRITE.search(unit[0].text):
+            return True
+    return False
+
+
+def clone_worker_database(admin_url: str, name: str) -> None:
+    recreate_database(admin_url, name, TEMPLATE_DB)
+
+
+def create_worker_databases(admin_url: str, workers: int) -> list[str]:
+    names = [f"{WORKER_DB_PREFIX}{i}" for i in range(1, workers + 1)]
+    for name in names:
+        clone_worker_database(admin_url, name)
+    return names
+
+
+def drop_worker_databases(admin_url: str, names: list[str]) -> None:
+    for name in names:
+        drop_database(admin_url, name)
+
+
+class CaseResult:
+    __slots__ = ("name", "seconds", "failure", "line", "skipped")
+
+    def __init__(self, name: str, seconds: float, failure: str | None = None, line: int | None = None,
+                 skipped: str | None = None):
+        self.name = name
+        self.seconds = seconds
+        self.failure = failure
+        self.line = line
+        self.skipped = skipped
+
+
+class FileResult:
+    __slots__ = ("path", "seconds", "cases", "error", "worker_db")
+
+    def __init__(self, path: Path, seconds: float, cases: list[CaseResult], error: str | None, worker_db: str):
+        self.path = path
+        self.seconds = seconds
+        self.cases = cases
+        self.error = error
+        self.worker_db = worker_db
+
+    @property
+    def failures(self) -> int:
+        return sum(1 for c in self.cases if c.failure) + (1 if self.error else 0)
+
+
+def parse_output(lines: list[tuple[float, str]], started: float) -> tuple[list[CaseResult], str | None]:
+    """Turn timestamped psql output into test cases.
+
+    A case is a `TEST <name> PASSED|FAILED|SKIPPED` message, optionally
+    marked ✓/✗/⊘; its time is the gap since the previous case. Result rows
+    containing ❌ (the report style of verify_rls_coverage.sql) count as
+    failures, and any other ERROR becomes the file-level error.
+    """
+    cases = []
+    error = None
+    last = started
+    for stamp, raw in lines:
+        line = raw.strip()
+        message = _MESSAGE.match(line)
+        if message:
+            text = message.group("text")
+            case = _CASE.match(text)
+            line_no = int(message.group("line")) if message.group("line") else None
+            if case:
+                result = case.group("result").upper()
+                failed = result == "FAILED" or message.group("level") in ("ERROR", "FATAL")
+                skipped = (case.group("detail") or "skipped") if result == "SKIPPED" and not failed else None
+                cases.append(CaseResult(case.group("name"), stamp - last, text if failed else None, line_no, skipped))
+                last = stamp
+            elif message.group("level") in ("ERROR", "FATAL") and error is None:
+                error = f"line {line_no}: {text}" if line_no else text
+        elif "❌" in line:
+            cells = [c.strip() for c in line.split("|")]
+            name = next((c for c in cells[1:2] if c), line)
+            cases.append(CaseResult(f"row {name}", 0.0, line))
+        elif error and line.startswith(("DETAIL:", "HINT:")):
+            error = f"{error}\n{line}"
+    return cases, error
+
+
+_worker_db = None
+_worker_dirty = False
+
+
+def _init_worker(queue) -> None:
+    global _worker_db
+    _worker_db = queue.get()
+
+
+def run_test_file(base_url: str, path: Path, commits: bool) -> FileResult:
+    global _worker_dirty
+    if _worker_dirty:
+        # The previous file on this worker committed changes; start from a clean clone
+        clone_worker_database(base_url, _worker_db)
+        _worker_dirty = False
+    _worker_dirty = commits
+    db_url = db_url_for(base_url, _worker_db)
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        ["psql", db_url, "-X", "-v", "ON_ERROR_STOP=1", "-f", str(path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    lines = [(time.monotonic(), line) for line in proc.stdout]
+    returncode = proc.wait()
+    seconds = time.monotonic() - started
+
+    cases, error = parse_output(lines, started)
+    if returncode != 0 and error is None:
+        error = f"psql exited with status {returncode}"
+    return FileResult(path, seconds, cases, error, _worker_db)
+
+
+def write_junit(results: list[FileResult], target: Path) -> None:
+    root = ET.Element("testsuites", name="supabase-sql-tests")
+    total_tests = total_failures = 0
+    total_time = 0.0
+    for result in results:
+        suite_name = result.path.relative_to(REPO_ROOT).as_posix()
+        cases = result.cases or [CaseResult(result.path.stem, result.seconds)]
+        suite = ET.SubElement(
+            root,
+            "testsuite",
+            name=suite_name,
+            tests=str(len(cases) + (1 if result.error and result.cases else 0)),
+            failures=str(result.failures),
+            skipped=str(sum(1 for c in cases if c.skipped)),
+            time=f"{result.seconds:.3f}",
+            hostname=result.worker_db,
+        )
+        for case in cases:
+            element = ET.SubElement(suite, "testcase", classname=suite_name, name=case.name, time=f"{case.seconds:.3f}")
+            if case.failure:
+                ET.SubElement(element, "failure", message=case.failure[:200]).text = case.failure
+            elif case.skipped:
+                ET.SubElement(element, "skipped", message=case.skipped[:200])
+        if result.error:
+            target_case = element if not result.cases else ET.SubElement(
+                suite, "testcase", classname=suite_name, name="file", time="0.000"
+            )
+            ET.SubElement(target_case, "failure", message=result.error.splitlines()[0][:200]).text = result.error
+        total_tests += len(suite.findall("testcase"))
+        total_failures += result.failures
+        total_time += result.seconds
+    root.set("tests", str(total_tests))
+    root.set("failures", str(total_failures))
+    root.set("time", f"{total_time:.3f}")
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(root).write(target, encoding="utf-8", xml_declaration=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run supabase SQL tests in parallel")
+    parser.add_argument("patterns", nargs="*", help="Only run files whose name contains one of these")
+    parser.add_argument("--db-url", default=os.getenv("DATABASE_URL", LOCAL_DB_URL),
+                        help="Admin connection string for the local database server")
+    parser.add_argument("--source-db", default="postgres", help="Migrated database to build the template from")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Parallel workers")
+    parser.add_argument("--junit", default="test-results/sql-tests.xml", help="JUnit XML output path")
+    parser.add_argument("--rebuild-template", action="store_true", help="Rebuild the template even if current")
+    parser.add_argument("--keep", action="store_true", help="Keep worker databases after the run")
+    args = parser.parse_args()
+
+    files = discover_tests(args.patterns)
+    if not files:
+        print("❌ No SQL test files found")
+        sys.exit(1)
+
+    workers = max(1, min(args.workers, len(files)))
+    print(f"\n🧪 SQL test runner: {len(files)} file(s), {workers} worker(s)\n")
+
+    try:
+        ensure_template(args.db_url, args.source_db, args.rebuild_template)
+        worker_dbs = create_worker_databases(args.db_url, workers)
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"❌ Could not prepare databases: {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    results = []
+    try:
+        queue = multiprocessing.Queue()
+        for name in worker_dbs:
+            queue.put(name)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(queue,)) as pool:
+            futures = [pool.submit(run_test_file, args.db_url, path, leaves_state(path)) for path in files]
+            for future in futures:
+                result = future.result()
+                results.append(result)
+                status = "✅" if result.failures == 0 else "❌"
+                print(f"{status} {result.path.name} ({len(result.cases)} case(s), {result.seconds:.2f}s, {result.worker_db})")
+                for case in result.cases:
+                    if case.failure:
+                        print(f"   ❌ {case.name}: {case.failure}")
+                    elif case.skipped:
+                        print(f"   ⊘ {case.name}: {case.skipped}")
+                if result.error:
+                    print(f"   ❌ {result.error}")
+    finally:
+        if not args.keep:
+            drop_worker_databases(args.db_url, worker_dbs)
+
+    elapsed = time.perf_counter() - started
+    write_junit(results, Path(args.junit))
+
+    failed = sum(1 for r in results if r.failures)
+    serial = sum(r.seconds for r in results)
+    print("\n" + "=" * 60)
+    print(f"📊 {len(results) - failed}/{len(results)} file(s) passed in {elapsed:.2f}s "
+          f"(serial time {serial:.2f}s)")
+    print(f"📝 JUnit XML: {args.junit}")
+    sys.exit(0 if failed == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+"""
+Cached schema model for supabase/migrations
+Parses migrations into compact in-memory structures (tables, columns,
+indexes, policies, functions, triggers) shared by the migration tooling.
+Each file's statements and schema events are cached under
+supabase/.temp/schema-model keyed by content hash, so only changed files are
+re-parsed.
+
+Usage:
+    python scripts/legacy/schema_model.py            # summary + load timings
+    python scripts/legacy/schema_model.py --clear-cache
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import re
+import sys
+import time
+from pathlib import Path
+
+import migration_sql
+from migration_sql import MIGRATIONS_DIR, Statement, migration_files, split_statements
+
+CACHE_DIR = MIGRATIONS_DIR.parent / ".temp" / "schema-model"
+
+# Identifier patterns shared by the migration tooling; QNAME captures a possibly schema-qualified name
+IDENT = r'(?:"[^"]+"|[\w$]+)'
+QNAME = rf"({IDENT}(?:\s*\.\s*{IDENT})?)"
+
+_TYPE_ALIASES = {
+    "int": "integer",
+    "int4": "integer",
+    "int8": "bigint",
+    "int2": "smallint",
+    "bool": "boolean",
+    "varchar": "character varying",
+    "timestamptz": "timestamp with time zone",
+    "timestamp": "timestamp without time zone",
+    "float8": "double precision",
+    "float4": "real",
+    "decimal": "numeric",
+}
+_MULTIWORD_TYPES = ("double ", "character ", "timestamp ", "time ", "bit ", "interval ")
+_ARG_MODES = ("in ", "out ", "inout ", "variadic ")
+_COLUMN_KEYWORDS = re.compile(
+    r"\s+(NOT\s+NULL|NULL|DEFAULT|PRIMARY\s+KEY|REFERENCES|UNIQUE|CHECK|CONSTRAINT|GENERATED|COLLATE)\b",
+    re.IGNORECASE,
+)
+_TABLE_CONSTRAINT = re.compile(r"(CONSTRAINT|PRIMARY\s+KEY|UNIQUE|CHECK|FOREIGN\s+KEY|EXCLUDE|LIKE)\b", re.IGNORECASE)
+_DDL_IN_BODY = re.compile(
+    r"\b(CREATE\s+(?:OR\s+REPLACE\s+)?(?:POLICY|FUNCTION|TRIGGER|(?:UNIQUE\s+)?INDEX|TABLE)"
+    r"|ALTER\s+(?:TABLE|POLICY)|DROP\s+(?:POLICY|FUNCTION|TRIGGER|INDEX|TABLE))\b",
+    re.IGNORECASE,
+)
+
+
+# ── identifier helpers ────────────────────────────────────────────────────────
+
+def ident(name: str) -> str:
+    """Normalize a possibly schema-qualified identifier (unquoted parts fold to lower case)"""
+    parts = [q if q else u.lower() for q, u in re.findall(r'"([^"]+)"|([^\s."]+)', name)]
+    if len(parts) == 1:
+        parts.insert(0, "public")
+    return ".".join(parts[-2:])
+
+
+def bare(name: str) -> str:
+    """Name without schema, as given back by ident()"""
+    return name.split(".", 1)[1] if "." in name else name
+
+
+def split_top_level(text: str) -> list[str]:
+    """Split on commas that are not inside parentheses or quotes"""
+    parts, depth, start, quote = [], 0, 0, None
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def paren_body(text: str, start: int) -> str:
+    """Return the balanced parenthesised text starting at text[start] == '('"""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == "(":
+            depth += 1
+        elif text[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def arg_types(args: str) -> tuple[str, ...]:
+    """Reduce a function argument list to its input types, the way a signature matches"""
+    types = []
+    for arg in split_top_level(args):
+        arg = re.split(r"\s+DEFAULT\s+|\s*=\s*", arg, maxsplit=1, flags=re.IGNORECASE)[0].strip()
+        lower = " ".join(arg.split()).lower()
+        if lower.startswith("out "):
+            continue
+        for mode in _ARG_MODES:
+            if lower.startswith(mode):
+                lower = lower[len(mode):]
+                break
+        words = lower.split(" ")
+        if len(words) > 1 and not lower.startswith(_MULTIWORD_TYPES):
+            lower = " ".join(words[1:])
+        lower = lower.replace("public.", "").replace('"', "")
+        base, brackets = re.match(r"^(.*?)((?:\[\])*)$", lower).groups()
+        types.append(_TYPE_ALIASES.get(base, base) + brackets)
+    return tuple(types)
+
+
+def function_ref(text: str) -> tuple[str, tuple[str, ...] | None]:
+    """Parse `name(args)` or a bare `name`; args is None when no signature is given"""
+    m = re.match(rf"{QNAME}\s*(\((.*)\))?", text, re.DOTALL)
+    args = arg_types(m.group(3)) if m.group(2) is not None else None
+    return ident(m.group(1)), args
+
+
+# ── model ─────────────────────────────────────────────────────────────────────
+
+class Column:
+    __slots__ = ("name", "type", "not_null", "default")
+
+    def __init__(self, name, type, not_null=False, default=None):
+        self.name = name
+        self.type = type
+        self.not_null = not_null
+        self.default = default
+
+
+class Table:
+    __slots__ = ("name", "columns", "rls", "file", "line")
+
+    def __init__(self, name, file, line):
+        self.name = name
+        self.columns: dict[str, Column] = {}
+        self.rls = False
+        self.file = file
+        self.line = line
+
+
+class Index:
+    __slots__ = ("name", "table", "unique", "definition", "file", "line")
+
+    def __init__(self, name, table, unique, definition, file, line):
+        self.name = name
+        self.table = table
+        self.unique = unique
+        self.definition = definition
+        self.file = file
+        self.line = line
+
+
+class Policy:
+    __slots__ = ("name", "table", "command", "roles", "file", "line")
+
+    def __init__(self, name, table, command, roles, file, line):
+        self.name = name
+        self.table = table
+        self.command = command
+        self.roles = roles
+        self.file = file
+        self.line = line
+
+
+class Function:
+    __slots__ = ("name", "args", "language", "security_definer", "file", "line")
+
+    def __init__(self, name, args, language, security_definer, file, line):
+        self.name = name
+        self.args = args
+        self.language = language
+        self.security_definer = security_definer
+        self.file = file
+        self.line = line
+
+    @property
+    def signature(self) -> str:
+        return f"{self.name}({', '.join(self.args)})"
+
+
+class Trigger:
+    __slots__ = ("name", "table", "function", "file", "line")
+
+    def __init__(self, name, table, function, file, line):
+        self.name = name
+        self.table = table
+        self.function = function
+        self.file = file
+        self.line = line
+
+
+class SchemaModel:
+    """Schema state after replaying the parsed events of every migration"""
+
+    def __init__(self):
+        self.tables: dict[str, Table] = {}
+        self.indexes: dict[str, Index] = {}
+        self.policies: dict[tuple[str, str], Policy] = {}
+        self.functions: dict[tuple[str, tuple[str, ...]], Function] = {}
+        self.triggers: dict[tuple[str, str], Trigger] = {}
+
+    def policies_on(self, table: str) -> list[Policy]:
+        return [p for (t, _), p in self.policies.items() if t == table]
+
+    def triggers_on(self, table: str) -> list[Trigger]:
+        return [t for (tbl, _), t in self.triggers.items() if tbl == table]
+
+    def functions_named(self, name: str) -> list[Function]:
+        name = ident(name)
+        return [f for (n, _), f in self.functions.items() if n == name]
+
+    def _drop_function(self, name, args):
+        if args is not None:
+            self.functions.pop((name, args), None)
+            return
+        overloads = [key for key in self.functions if key[0] == name]
+        if len(overloads) == 1:
+            del self.functions[overloads[0]]
+
+    def _rename_table(self, old, new):
+        table = self.tables.pop(old, None)
+        if table:
+            table.name = new
+            self.tables[new] = table
+        # Policies, triggers and indexes follow the table
+        for key in [k for k in self.policies if k[0] == old]:
+            policy = self.policies.pop(key)
+            policy.table = new
+            self.policies[(new, key[1])] = policy
+        for key in [k for k in self.triggers if k[0] == old]:
+            trigger = self.triggers.pop(key)
+            trigger.table = new
+            self.triggers[(new, key[1])] = trigger
+        for index in self.indexes.values():
+            if index.table == old:
+                index.table = new
+
+    def apply(self, event: tuple, file: str) -> None:
+        kind = event[0]
+        if kind == "table":
+            _, name, line, columns = event
+            table = Table(name, file, line)
+            for col in columns:
+                table.columns[col[0]] = Column(*col)
+            self.tables[name] = table
+        elif kind == "drop_table":
+            self.tables.pop(event[1], None)
+            for key in [k for k in self.policies if k[0] == event[1]]:
+                del self.policies[key]
+            for key in [k for k in self.triggers if k[0] == event[1]]:
+                del self.triggers[key]
+            for key in [k for k, idx in self.indexes.items() if idx.table == event[1]]:
+                del self.indexes[key]
+        elif kind == "rename_table":
+            self._rename_table(event[1], event[2])
+        elif kind in ("add_column", "alter_column", "drop_column", "rename_column", "rls"):
+            table = self.tables.get(event[1])
+            if table is None:
+                return
+            if kind == "add_column":
+                table.columns[event[2][0]] = Column(*event[2])
+            elif kind == "drop_column":
+                table.columns.pop(event[2], None)
+            elif kind == "rename_column":
+                col = table.columns.pop(event[2], None)
+                if col:
+                    col.name = event[3]
+                    table.columns[event[3]] = col
+            elif kind == "rls":
+                table.rls = event[2]
+            else:
+                col = table.columns.get(event[2])
+                if col:
+                    setattr(col, event[3], event[4])
+        elif kind == "index":
+            _, name, table, unique, definition, line = event
+            self.indexes[name] = Index(name, table, unique, definition, file, line)
+        elif kind == "drop_index":
+            self.indexes.pop(event[1], None)
+        elif kind == "policy":
+            _, table, name, command, roles, line = event
+            self.policies[(table, name)] = Policy(name, table, command, roles, file, line)
+        elif kind == "alter_policy":
+            _, table, name, roles, line = event
+            policy = self.policies.get((table, name))
+            if policy:
+                policy.file, policy.line = file, line
+                if roles is not None:
+                    policy.roles = roles
+        elif kind == "rename_policy":
+            policy = self.policies.pop((event[1], event[2]), None)
+            if policy:
+                policy.name = event[3]
+                self.policies[(event[1], event[3])] = policy
+        elif kind == "drop_policy":
+            self.policies.pop((event[1], event[2]), None)
+        elif kind == "function":
+            _, name, args, language, security_definer, line = event
+            self.functions[(name, args)] = Function(name, args, language, security_definer, file, line)
+        elif kind == "drop_function":
+            self._drop_function(event[1], event[2])
+        elif kind == "trigger":
+            _, table, name, function, line = event
+            self.triggers[(table, name)] = Trigger(name, table, function, file, line)
+        elif kind == "drop_trigger":
+            self.triggers.pop((event[1], event[2]), None)
+
+
+# ── parser ────────────────────────────────────────────────────────────────────
+
+def _column(definition: str) -> tuple | None:
+    m = re.match(rf"({IDENT})\s+(.*)$", definition, re.DOTALL)
+    if not m:
+        return None
+    name = bare(ident(m.group(1)))
+    rest = m.group(2)
+    keyword = _COLUMN_KEYWORDS.search(" " + rest)
+    col_type = (rest[:keyword.start()] if keyword else rest).strip().lower()
+    upper = rest.upper()
+    not_null = bool(re.search(r"\bNOT\s+NULL\b|\bPRIMARY\s+KEY\b", upper))
+    default = None
+    d = re.search(r"\bDEFAULT\s+(.*)", rest, re.IGNORECASE | re.DOTALL)
+    if d:
+        tail = _COLUMN_KEYWORDS.search(" " + d.group(1))
+        default = (d.group(1)[:tail.start()] if tail else d.group(1)).strip()
+    return (name, col_type, not_null, default)
+
+
+def _alter_table_events(table: str, actions: str) -> list[tuple]:
+    events = []
+    for action in split_top_level(actions):
+        flat = " ".join(action.split())
+        upper = flat.upper()
+        if upper.startswith("ADD") and not re.match(r"ADD\s+" + _TABLE_CONSTRAINT.pattern, upper):
+            definition = re.sub(r"^ADD\s+(COLUMN\s+)?(IF\s+NOT\s+EXISTS\s+)?", "", flat, flags=re.IGNORECASE)
+            col = _column(definition)
+            if col:
+                events.append(("add_column", table, col))
+        elif m := re.match(rf"DROP\s+(?:COLUMN\s+)?(?:IF\s+EXISTS\s+)?({IDENT})", flat, re.IGNORECASE):
+            if m.group(1).upper() != "CONSTRAINT":
+                events.append(("drop_column", table, bare(ident(m.group(1)))))
+        elif m := re.match(rf"RENAME\s+(?:COLUMN\s+)?({IDENT})\s+TO\s+({IDENT})", flat, re.IGNORECASE):
+            if m.group(1).upper() != "CONSTRAINT":
+                events.append(("rename_column", table, bare(ident(m.group(1))), bare(ident(m.group(2)))))
+        elif m := re.match(rf"RENAME\s+TO\s+({IDENT})", flat, re.IGNORECASE):
+            events.append(("rename_table", table, f"{table.split('.')[0]}.{bare(ident(m.group(1)))}"))
+        elif m := re.match(rf"ALTER\s+(?:COLUMN\s+)?({IDENT})\s+(.*)$", flat, re.IGNORECASE):
+            column, change = bare(ident(m.group(1))), m.group(2)
+            if t := re.match(r"(?:SET\s+DATA\s+)?TYPE\s+(.*?)(\s+USING\s+.*)?$", change, re.IGNORECASE):
+                events.append(("alter_column", table, column, "type", t.group(1).strip().lower()))
+            elif re.match(r"SET\s+NOT\s+NULL", change, re.IGNORECASE):
+                events.append(("alter_column", table, column, "not_null", True))
+            elif re.match(r"DROP\s+NOT\s+NULL", change, re.IGNORECASE):
+                events.append(("alter_column", table, column, "not_null", False))
+            elif d := re.match(r"SET\s+DEFAULT\s+(.*)$", change, re.IGNORECASE):
+                events.append(("alter_column", table, column, "default", d.group(1).strip()))
+            elif re.match(r"DROP\s+DEFAULT", change, re.IGNORECASE):
+                events.append(("alter_column", table, column, "default", None))
+        elif re.match(r"(ENABLE|DISABLE)\s+ROW\s+LEVEL\s+SECURITY", upper):
+            events.append(("rls", table, upper.startswith("ENABLE")))
+    return events
+
+
+def statement_events(text: str, line: int) -> list[tuple]:
+    """Translate one statement into schema events (plain tuples, cheap to cache)"""
+    flat = " ".join(text.split())
+    upper = flat[:40].upper()
+
+    if upper.startswith("DO"):
+        body = re.search(r"(\$[\w]*\$)(.*)\1", text, re.DOTALL)
+        events = []
+        if body:
+            offset = text.count("\n", 0, body.start(2))
+            for inner in split_statements(body.group(2)):
+                match = _DDL_IN_BODY.search(inner.text)
+                if match:
+                    inner_line = line + offset + inner.line - 1 + inner.text.count("\n", 0, match.start())
+                    events.extend(statement_events(inner.text[match.start():], inner_line))
+        return events
+
+    if m := re.match(rf"CREATE\s+(?:UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?{QNAME}\s*\(", flat, re.IGNORECASE):
+        body = paren_body(flat, m.end() - 1)[1:-1]
+        columns = tuple(
+            col for item in split_top_level(body)
+            if not _TABLE_CONSTRAINT.match(item) and (col := _column(item))
+        )
+        return [("table", ident(m.group(1)), line, columns)]
+
+    if m := re.match(rf"ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?{QNAME}\s+(.*)$", flat, re.IGNORECASE):
+        return _alter_table_events(ident(m.group(1)), m.group(2))
+
+    if m := re.match(r"DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?(.*?)(\s+(CASCADE|RESTRICT))?$", flat, re.IGNORECASE):
+        return [("drop_table", ident(part)) for part in split_top_level(m.group(1))]
+
+    if m := re.match(
+        rf"CREATE\s+(UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?({IDENT})\s+ON\s+(?:ONLY\s+)?{QNAME}\s*(.*)$",
+        flat,
+        re.IGNORECASE,
+    ):
+        table = ident(m.group(3))
+        name = f"{table.split('.')[0]}.{bare(ident(m.group(2)))}"
+        return [("index", name, table, bool(m.group(1)), m.group(4), line)]
+
+    if m := re.match(r"DROP\s+INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+EXISTS\s+)?(.*?)(\s+(CASCADE|RESTRICT))?$", flat, re.IGNORECASE):
+        return [("drop_index", ident(part)) for part in split_top_level(m.group(1))]
+
+    if m := re.match(rf"CREATE\s+POLICY\s+({IDENT})\s+ON\s+{QNAME}(.*)$", flat, re.IGNORECASE):
+        rest = m.group(3)
+        command = re.search(r"\bFOR\s+(ALL|SELECT|INSERT|UPDATE|DELETE)\b", rest, re.IGNORECASE)
+        roles = re.search(r"\bTO\s+(.*?)(\s+USING\b|\s+WITH\s+CHECK\b|$)", rest, re.IGNORECASE)
+        return [(
+            "policy",
+            ident(m.group(2)),
+            bare(ident(m.group(1))),
+            command.group(1).upper() if command else "ALL",
+            roles.group(1).strip() if roles else "public",
+            line,
+        )]
+
+    if m := re.match(rf"ALTER\s+POLICY\s+({IDENT})\s+ON\s+{QNAME}\s*(.*)$", flat, re.IGNORECASE):
+        table, name, rest = ident(m.group(2)), bare(ident(m.group(1))), m.group(3)
+        if r := re.match(rf"RENAME\s+TO\s+({IDENT})", rest, re.IGNORECASE):
+            return [("rename_policy", table, name, bare(ident(r.group(1))))]
+        roles = re.match(r"TO\s+(.*?)(\s+USING\b|\s+WITH\s+CHECK\b|$)", rest, re.IGNORECASE)
+        return [("alter_policy", table, name, roles.group(1).strip() if roles else None, line)]
+
+    if m := re.match(rf"DROP\s+POLICY\s+(?:IF\s+EXISTS\s+)?({IDENT})\s+ON\s+{QNAME}", flat, re.IGNORECASE):
+        return [("drop_policy", ident(m.group(2)), bare(ident(m.group(1))))]
+
+    if m := re.match(r"CREATE\s+(?:OR\s+REPLACE\s+)?(?:FUNCTION|PROCEDURE)\s+", flat, re.IGNORECASE):
+        rest = flat[m.end():]
+        name = ident(re.match(QNAME, rest).group(1))
+        args = paren_body(rest, rest.index("(")) if "(" in rest else "()"
+        # LANGUAGE and SECURITY DEFINER follow the body; look outside the dollar-quoted part
+        outside = re.sub(r"(\$[\w]*\$).*?\1", " ", rest, flags=re.DOTALL)
+        language = re.search(r"\bLANGUAGE\s+'?(\w+)", outside, re.IGNORECASE)
+        return [(
+            "function",
+            name,
+            arg_types(args[1:-1]),
+            language.group(1).lower() if language else "sql",
+            bool(re.search(r"\bSECURITY\s+DEFINER\b", outside, re.IGNORECASE)),
+            line,
+        )]
+
+    if m := re.match(r"DROP\s+(?:FUNCTION|PROCEDURE)\s+(?:IF\s+EXISTS\s+)?(.*?)(\s+(CASCADE|RESTRICT))?$", flat, re.IGNORECASE):
+        return [("drop_function", *function_ref(part)) for part in split_top_level(m.group(1))]
+
+    if m := re.match(
+        rf"CREATE\s+(?:OR\s+REPLACE\s+)?(?:CONSTRAINT\s+)?TRIGGER\s+({IDENT})\s+.*?\bON\s+{QNAME}.*?\bEXECUTE\s+(?:FUNCTION|PROCEDURE)\s+{QNAME}",
+        flat,
+        re.IGNORECASE,
+    ):
+        return [("trigger", ident(m.group(2)), bare(ident(m.group(1))), ident(m.group(3)), line)]
+
+    if m := re.match(rf"DROP\s+TRIGGER\s+(?:IF\s+EXISTS\s+)?({IDENT})\s+ON\s+{QNAME}", flat, re.IGNORECASE):
+        return [("drop_trigger", ident(m.group(2)), bare(ident(m.group(1))))]
+
+    return []
+
+
+# ── cache ─────────────────────────────────────────────────────────────────────
+
+class ParsedFile:
+    __slots__ = ("path", "digest", "statements", "events")
+
+    def __init__(self, path: Path, digest: str, statements: list[Statement], events: list[tuple]):
+        self.path = path
+        self.digest = digest
+        self.statements = statements
+        self.events = events
+
+
+def _parse(path: Path, data: bytes, digest: str) -> ParsedFile:
+    statements = split_statements(data.decode("utf-8"))
+    events = [e for stmt in statements for e in statement_events(stmt.text, stmt.line)]
+    return ParsedFile(path, digest, statements, events)
+
+
+def parser_key() -> str:
+    """Hash of the parser source; entries written by any other parser version are ignored"""
+    digest = hashlib.sha256()
+    for module in (Path(__file__), Path(migration_sql.__file__)):
+        digest.update(module.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+# Anything a stale or truncated pickle can raise while loading or unpacking
+_CACHE_ERRORS = (OSError, EOFError, pickle.PickleError, TypeError, AttributeError, ValueError, ImportError, IndexError)
+
+
+class ModelCache:
+    """Per-file parse cache keyed by content hash and parser version.
+
+    An index of (mtime, size) → digest avoids re-hashing unchanged files, so
+    a warm load only reads the pickled entries.
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, key: str | None = None):
+        self.cache_dir = cache_dir
+        self.key = key or parser_key()
+        self.index_path = cache_dir / f"index-{self.key}.pickle"
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._dirty = False
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            try:
+                with open(self.index_path, "rb") as f:
+                    self._index = pickle.load(f)
+            except _CACHE_ERRORS:
+                self._index = None
+            if not isinstance(self._index, dict):
+                self._index = {}
+        return self._index
+
+    def _entry_path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}-{self.key}.pickle"
+
+    def parse(self, path: Path) -> ParsedFile:
+        index = self._load_index()
+        stat = path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        known = index.get(path.name)
+        data = None
+        if isinstance(known, tuple) and len(known) == 2 and known[0] == stamp:
+            digest = known[1]
+        else:
+            data = path.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            index[path.name] = (stamp, digest)
+            self._dirty = True
+
+        entry = self._entry_path(digest)
+        try:
+            with open(entry, "rb") as f:
+                statements, events = pickle.load(f)
+            parsed = ParsedFile(path, digest, [Statement(*s) for s in statements], list(events))
+            self.hits += 1
+            return parsed
+        except _CACHE_ERRORS:
+            pass
+
+        self.misses += 1
+        parsed = _parse(path, data if data is not None else path.read_bytes(), digest)
+        self._write(entry, ([tuple(s) for s in parsed.statements], parsed.events))
+        return parsed
+
+    def _write(self, target: Path, payload) -> None:
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, target)
+        except OSError:
+            pass
+
+    def save(self) -> None:
+        if self._dirty:
+            self._write(self.index_path, self._index)
+            self._dirty = False
+
+    def clear(self) -> int:
+        removed = 0
+        if self.cache_dir.exists():
+            for entry in self.cache_dir.glob("*.pickle"):
+                entry.unlink()
+                removed += 1
+        self._index = None
+        return removed
+
+
+_default_cache = None
+
+
+def default_cache() -> ModelCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ModelCache()
+    return _default_cache
+
+
+def cached_statements(path: Path) -> list[Statement]:
+    """Statements of a migration file, from the shared cache when unchanged"""
+    cache = default_cache()
+    parsed = cache.parse(path)
+    cache.save()
+    return parsed.statements
+
+
+def load_model(files: list[Path] | None = None, cache: ModelCache | None = None) -> SchemaModel:
+    """Replay every migration's events into a SchemaModel"""
+    cache = cache or default_cache()
+    model = SchemaModel()
+    for path in files if files is not None else migration_files():
+        parsed = cache.parse(path)
+        for event in parsed.events:
+            model.apply(event, path.name)
+    cache.save()
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the cached schema model for supabase/migrations")
+    parser.add_argument("--clear-cache", action="store_true", help="Remove cached parse results and exit")
+    args = parser.parse_args()
+
+    cache = ModelCache()
+    if args.clear_cache:
+        print(f"🧹 Removed {cache.clear()} cache file(s) from {cache.cache_dir}")
+        sys.exit(0)
+
+    started = time.perf_counter()
+    model = load_model(cache=cache)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    print(f"\n🧩 Schema model: {len(model.tables)} tables, "
+          f"{sum(len(t.columns) for t in model.tables.values())} columns, {len(model.indexes)} indexes, "
+          f"{len(model.policies)} policies, {len(model.functions)} functions, {len(model.triggers)} triggers")
+    print(f"⏱️  Loaded in {elapsed:.1f} ms ({cache.hits} cached file(s), {cache.misses} parsed)")
+    without_rls = sorted(t.name for t in model.tables.values() if t.name.startswith("public.") and not t.rls)
+    if without_rls:
+        print(f"⚠️  {len(without_rls)} public table(s) without RLS in migrations: {', '.join(without_rls[:10])}"
+              + (" …" if len(without_rls) > 10 else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+SQL-over-HTTP execution backend
+Sends migration SQL to an SQL-execution endpoint (Supabase Management API
+`POST /v1/projects/{ref}/database/query` or a compatible stand-in) over a
+single pooled keep-alive connection.
+"""
+
+import gzip
+import http.client
+import json
+import select
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from analyze_migrations import TX_COMMIT_BEFORE_USE, TX_NEVER, classify
+from migration_sql import Statement, join_statements, pack_batches, read_statements
+
+MANAGEMENT_API_URL = "https://api.supabase.com/v1/projects/{ref}/database/query"
+DEFAULT_MAX_BATCH_BYTES = 256 * 1024
+HISTORY_TABLE = "supabase_migrations.schema_migrations"
+
+# Same shape as the table the Supabase CLI keeps, so `supabase db push` agrees on what is applied
+_HISTORY_DDL = f"""
+CREATE SCHEMA IF NOT EXISTS supabase_migrations;
+CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (version text NOT NULL PRIMARY KEY);
+ALTER TABLE {HISTORY_TABLE} ADD COLUMN IF NOT EXISTS statements text[];
+ALTER TABLE {HISTORY_TABLE} ADD COLUMN IF NOT EXISTS name text;
+"""
+
+
+class SqlHttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class SqlOutcomeUnknown(SqlHttpError):
+    """The connection dropped after the request was sent; the SQL may or may not have run"""
+
+    def __init__(self, reason: str):
+        super().__init__(0, f"connection lost after the request was sent ({reason}); "
+                            "outcome unknown, check the database before re-running")
+
+
+# Refused or timed-out connections, HTTP errors, or a 2xx body that is not JSON (e.g. a proxy page)
+REQUEST_ERRORS = (SqlHttpError, OSError, http.client.HTTPException, ValueError)
+
+
+class SqlHttpClient:
+    """Executes SQL over one persistent HTTP/1.1 connection"""
+
+    def __init__(self, endpoint: str, token: str, use_gzip: bool = True, timeout: float = 300):
+        parsed = urlparse(endpoint)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported endpoint scheme: {endpoint}")
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path = parsed.path or "/"
+        if parsed.query:
+            self.path += f"?{parsed.query}"
+        self.token = token
+        self.use_gzip = use_gzip
+        self.timeout = timeout
+        self.requests_sent = 0
+        self.bytes_sent = 0
+        self.connections_opened = 0
+        self._conn = None
+
+    def _connect(self):
+        conn_cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        self._conn = conn_cls(self.host, self.port, timeout=self.timeout)
+        self.connections_opened += 1
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _stale(self) -> bool:
+        """True when a pooled connection was closed (or written to) by the server while idle"""
+        sock = self._conn.sock if self._conn is not None else None
+        if sock is None:
+            return False
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable)
+
+    def _send(self, body: bytes, headers: dict) -> tuple[int, bytes]:
+        if self._conn is not None and self._stale():
+            self.close()
+        for attempt in range(2):
+            reused = self._conn is not None
+            if self._conn is None:
+                self._connect()
+            try:
+                self._conn.request("POST", self.path, body=body, headers=headers)
+            except (BrokenPipeError, ConnectionResetError):
+                # The server never got the whole request, so nothing ran; a
+                # reused connection gets one reconnect and resend.
+                self.close()
+                if not reused or attempt:
+                    raise
+                continue
+            break
+
+        try:
+            response = self._conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, ConnectionError, TimeoutError) as e:
+            # The request was written: never resend non-idempotent SQL blindly
+            self.close()
+            raise SqlOutcomeUnknown(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__) from e
+        if response.will_close:
+            self.close()
+        return response.status, data
+
+    def execute(self, sql: str):
+        """Execute SQL and return the decoded JSON response"""
+        payload = json.dumps({"query": sql}).encode("utf-8")
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Connection": "keep-alive",
+        }
+        body = payload
+        if self.use_gzip:
+            body = gzip.compress(payload, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+
+        status, data = self._send(body, headers)
+
+        if status == 415 and self.use_gzip:
+            # Endpoint does not accept compressed bodies; fall back for the rest of the run
+            self.use_gzip = False
+            return self.execute(sql)
+
+        self.requests_sent += 1
+        self.bytes_sent += len(body)
+
+        text = data.decode("utf-8", errors="replace")
+        if status >= 400:
+            try:
+                message = json.loads(text).get("message", text)
+            except (ValueError, AttributeError):
+                message = text
+            raise SqlHttpError(status, message)
+        return json.loads(text) if text.strip() else None
+
+
+class FileResult:
+    def __init__(self, path: Path, statements: int, batches: int, seconds: float, error: str | None = None):
+        self.path = path
+        self.statements = statements
+        self.batches = batches
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _outside_transaction(stmt: Statement) -> bool:
+    return any(r.transactional == TX_NEVER for r in classify(stmt))
+
+
+def _commit_before_use(stmt: Statement) -> bool:
+    return any(r.transactional == TX_COMMIT_BEFORE_USE for r in classify(stmt))
+
+
+def plan_requests(statements: list[Statement], max_batch_bytes: int) -> list[list[Statement]]:
+    """Batches to send, one request each.
+
+    A multi-statement request runs as one implicit transaction, so statements
+    that cannot run in a transaction block (CREATE INDEX CONCURRENTLY, VACUUM)
+    are sent alone, and a request ends after ALTER TYPE ... ADD VALUE so later
+    statements can use the new value.
+    """
+    return pack_batches(statements, max_batch_bytes, alone=_outside_transaction, cut_after=_commit_before_use)
+
+
+def migration_version(path: Path) -> tuple[str, str]:
+    """(version, name) of a migration file, split the way the Supabase CLI does"""
+    version, _, name = path.stem.partition("_")
+    return version, name
+
+
+def _literal(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _history_insert(path: Path, statements: list[Statement]) -> Statement:
+    version, name = migration_version(path)
+    array = "ARRAY[" + ", ".join(_literal(s.text) for s in statements) + "]::text[]"
+    return Statement(
+        f"INSERT INTO {HISTORY_TABLE} (version, name, statements) VALUES ({_literal(version)}, {_literal(name)}, {array})",
+        statements[-1].line if statements else 1,
+    )
+
+
+def applied_versions(client: SqlHttpClient) -> set[str]:
+    """Versions recorded in the migration history, creating the table if the project has none"""
+    client.execute(_HISTORY_DDL)
+    rows = client.execute(f"SELECT version FROM {HISTORY_TABLE}")
+    return {row["version"] for row in rows or []}
+
+
+def pending_files(client: SqlHttpClient, files: list[Path]) -> list[Path]:
+    """Files whose version is not in the migration history yet"""
+    applied = applied_versions(client)
+    return [f for f in files if migration_version(f)[0] not in applied]
+
+
+def execute_file(
+    client: SqlHttpClient,
+    path: Path,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    record_version: bool = False,
+) -> FileResult:
+    """Execute one migration file, batching small statements and splitting large files.
+
+    Each request runs as its own implicit transaction on the server, so a file
+    that is split into several batches is not atomic. Execution stops at the
+    first failing batch. With record_version, the history row is inserted in
+    the same request as the file's last batch, so it is recorded exactly when
+    that batch commits.
+    """
+    statements = read_statements(path)
+    batches = plan_requests(statements, max_batch_bytes)
+    if record_version:
+        insert = _history_insert(path, statements)
+        if batches and not any(_outside_transaction(s) for s in batches[-1]):
+            batches[-1] = batches[-1] + [insert]
+        else:
+            batches.append([insert])
+    started = time.perf_counter()
+    for index, batch in enumerate(batches, 1):
+        try:
+            client.execute(join_statements(batch))
+        except SqlHttpError as e:
+            error = e.message
+        except REQUEST_ERRORS as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            continue
+        return FileResult(
+            path,
+            len(statements),
+            len(batches),
+            time.perf_counter() - started,
+            f"batch {index}/{len(batches)} (line {batch[0].line}): {error}",
+        )
+    return FileResult(path, len(statements), len(batches), time.perf_counter() - started)
+
+
+def describe_batches(statements: list[Statement], max_batch_bytes: int) -> list[tuple[int, int]]:
+    """Return (statement count, byte size) per batch, for dry runs"""
+    return [
+        (len(batch), len(join_statements(batch).encode("utf-8")))
+        for batch in plan_requests(statements, max_batch_bytes)
+    ]
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Migration squash generator
+Folds a range of migrations into one canonical baseline file. Create-then-drop
+pairs of policies, functions, indexes and triggers are removed, superseded
+CREATE OR REPLACE FUNCTION versions are dropped, and everything else keeps its
+original order. With --verify, both versions are applied to scratch databases
+and their catalogs are diffed to prove the squash is equivalent.
+
+Usage:
+    python scripts/legacy/squash_migrations.py --to 20260320232000 --output supabase/squashed_baseline.sql
+    python scripts/legacy/squash_migrations.py --to 20260320232000 --verify --db-url "$LOCAL_DB_URL"
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from migration_sql import (
+    LOCAL_DB_URL,
+    MIGRATIONS_DIR,
+    Statement,
+    base_template,
+    drop_database,
+    join_statements,
+    migration_files,
+    psql_rows,
+    recreate_database,
+)
+from schema_model import (
+    IDENT,
+    QNAME,
+    arg_types,
+    bare,
+    cached_statements,
+    function_ref,
+    ident,
+    paren_body,
+    split_top_level,
+)
+
+DEFAULT_OUTPUT = MIGRATIONS_DIR.parent / "squashed_baseline.sql"
+ORIGINAL_DB = "lekbanken_squash_original"
+CANDIDATE_DB = "lekbanken_squash_candidate"
+
+
+def object_events(stmt: Statement) -> list[tuple[tuple, str, bool]]:
+    """Return (object key, action, cascade) for objects this statement defines.
+
+    Actions are create, replace, drop, alter (ALTER POLICY changing TO, USING
+    or WITH CHECK) and attr (GRANT/COMMENT/ALTER on an existing object).
+    Function keys carry input types, or None when the statement names the
+    function without a signature.
+    """
+    flat = " ".join(stmt.text.split())
+    cascade = bool(re.search(r"\bCASCADE\s*$", flat, re.IGNORECASE))
+
+    m = re.match(r"CREATE\s+(OR\s+REPLACE\s+)?(FUNCTION|PROCEDURE)\s+", flat, re.IGNORECASE)
+    if m:
+        rest = flat[m.end():]
+        name = re.match(QNAME, rest).group(1)
+        args = paren_body(rest, rest.index("(")) if "(" in rest else "()"
+        key = ("function", ident(name), arg_types(args[1:-1]))
+        return [(key, "replace" if m.group(1) else "create", False)]
+
+    m = re.match(r"DROP\s+(FUNCTION|PROCEDURE)\s+(IF\s+EXISTS\s+)?(.*?)(\s+(CASCADE|RESTRICT))?$", flat, re.IGNORECASE)
+    if m:
+        refs = [function_ref(part) for part in split_top_level(m.group(3))]
+        return [(("function", name, args), "drop", cascade) for name, args in refs]
+
+    m = re.match(r"(GRANT|REVOKE)\s+.*?\s+ON\s+(FUNCTION|PROCEDURE)\s+(.*?)\s+(TO|FROM)\s", flat, re.IGNORECASE)
+    if m:
+        refs = [function_ref(part) for part in split_top_level(m.group(3))]
+        return [(("function", name, args), "attr", False) for name, args in refs]
+
+    m = re.match(r"(COMMENT\s+ON|ALTER)\s+(FUNCTION|PROCEDURE)\s+(.*)$", flat, re.IGNORECASE)
+    if m:
+        name, args = function_ref(m.group(3))
+        return [(("function", name, args), "attr", False)]
+
+    m = re.match(rf"CREATE\s+POLICY\s+({IDENT})\s+ON\s+{QNAME}", flat, re.IGNORECASE)
+    if m:
+        return [(("policy", ident(m.group(2)), bare(ident(m.group(1)))), "create", False)]
+
+    m = re.match(rf"(DROP|ALTER|COMMENT\s+ON)\s+POLICY\s+(?:IF\s+EXISTS\s+)?({IDENT})\s+ON\s+{QNAME}", flat, re.IGNORECASE)
+    if m:
+        action = {"DROP": "drop", "ALTER": "alter"}.get(m.group(1).upper(), "attr")
+        if action == "alter" and re.search(r"\bRENAME\s+TO\b", flat, re.IGNORECASE):
+            action = "attr"
+        return [(("policy", ident(m.group(3)), bare(ident(m.group(2)))), action, cascade)]
+
+    m = re.match(
+        rf"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?({IDENT})\s+ON\s+(?:ONLY\s+)?{QNAME}",
+        flat,
+        re.IGNORECASE,
+    )
+    if m:
+        schema = ident(m.group(2)).split(".", 1)[0]
+        return [(("index", f"{schema}.{bare(ident(m.group(1)))}"), "create", False)]
+
+    m = re.match(r"DROP\s+INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+EXISTS\s+)?(.*?)(\s+(CASCADE|RESTRICT))?$", flat, re.IGNORECASE)
+    if m:
+        return [(("index", ident(part)), "drop", cascade) for part in split_top_level(m.group(1))]
+
+    m = re.match(rf"(COMMENT\s+ON|ALTER)\s+INDEX\s+(?:IF\s+EXISTS\s+)?{QNAME}", flat, re.IGNORECASE)
+    if m:
+        return [(("index", ident(m.group(2))), "attr", False)]
+
+    m = re.match(
+        rf"CREATE\s+(OR\s+REPLACE\s+)?(?:CONSTRAINT\s+)?TRIGGER\s+({IDENT})\s+.*?\bON\s+{QNAME}", flat, re.IGNORECASE
+    )
+    if m:
+        key = ("trigger", ident(m.group(3)), bare(ident(m.group(2))))
+        return [(key, "replace" if m.group(1) else "create", False)]
+
+    m = re.match(rf"(DROP|ALTER|COMMENT\s+ON)\s+TRIGGER\s+(?:IF\s+EXISTS\s+)?({IDENT})\s+ON\s+{QNAME}", flat, re.IGNORECASE)
+    if m:
+        action = "drop" if m.group(1).upper() == "DROP" else "attr"
+        return [(("trigger", ident(m.group(3)), bare(ident(m.group(2)))), action, cascade)]
+
+    return []
+
+
+_POLICY_HEAD = re.compile(rf"(CREATE|ALTER)\s+POLICY\s+{IDENT}\s+ON\s+{QNAME}", re.IGNORECASE)
+_POLICY_CLAUSE = re.compile(r"\b(AS|FOR|TO|USING|WITH\s+CHECK|RENAME)\b", re.IGNORECASE)
+_POLICY_ORDER = ("AS", "FOR", "TO", "USING", "WITH CHECK")
+
+
+def _policy_clauses(text: str) -> tuple[str, dict[str, str]] | None:
+    """Split a CREATE/ALTER POLICY into its head and {clause keyword: raw value}"""
+    m = _POLICY_HEAD.match(text)
+    if not m:
+        return None
+    tail = text[m.end():]
+    depth, quote, top_level = 0, None, []
+    for i, ch in enumerate(tail):
+        if quote:
+            quote = None if ch == quote else quote
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        top_level.append(depth == 0 and quote is None)
+    keywords = [k for k in _POLICY_CLAUSE.finditer(tail) if top_level[k.start()]]
+    if not keywords or tail[:keywords[0].start()].strip():
+        return None
+    clauses = {}
+    for k, following in zip(keywords, keywords[1:] + [None]):
+        keyword = " ".join(k.group(1).upper().split())
+        if keyword in clauses:
+            return None
+        clauses[keyword] = tail[k.end():following.start() if following else len(tail)].strip()
+    return text[:m.end()], clauses
+
+
+def merge_policy(create_sql: str, alter_sql: str) -> str | None:
+    """CREATE POLICY equivalent to create_sql followed by alter_sql, or None if it cannot be merged"""
+    created = _policy_clauses(create_sql)
+    altered = _policy_clauses(alter_sql)
+    if created is None or altered is None or not set(altered[1]) <= {"TO", "USING", "WITH CHECK"}:
+        return None
+    head, clauses = created
+    clauses = {**clauses, **altered[1]}
+    return head + "".join(f"\n  {keyword} {clauses[keyword]}" for keyword in _POLICY_ORDER if keyword in clauses)
+
+
+def _key_label(key: tuple) -> str:
+    if key[0] == "function":
+        return f"function {key[1]}({', '.join(key[2] or ())})"
+    if key[0] in ("policy", "trigger"):
+        return f'{key[0]} "{key[2]}" on {key[1]}'
+    return f"{key[0]} {key[1]}"
+
+
+def _reference_pattern(key: tuple) -> re.Pattern:
+    name = bare(key[1]) if key[0] in ("function", "index") else key[2]
+    return re.compile(rf"(?<![\w$]){re.escape(name)}(?![\w$])", re.IGNORECASE)
+
+
+class SquashPlan:
+    """Which statements of the range survive, and in which order"""
+
+    def __init__(self, statements: list[tuple[Path, Statement]]):
+        self.statements = statements
+        self.removed: dict[int, str] = {}
+        self.rewritten: dict[int, Statement] = {}
+        self.anchor: dict[int, int] = {}
+        self.folded: list[str] = []
+
+    def _safe(self, key: tuple, first: int, last: int, skip: set[int]) -> bool:
+        """True when no statement between first and last depends on the object"""
+        pattern = _reference_pattern(key)
+        for idx in range(first + 1, last):
+            if idx in skip or idx in self.removed:
+                continue
+            if pattern.search(self.statements[idx][1].text):
+                return False
+        return True
+
+    def build(self):
+        live: dict[tuple, dict] = {}
+
+        def lookup(key):
+            if key in live or key[0] != "function" or key[2] is not None:
+                return key
+            overloads = [k for k in live if k[0] == "function" and k[1] == key[1]]
+            return overloads[0] if len(overloads) == 1 else key
+
+        for idx, (_, stmt) in enumerate(self.statements):
+            events = object_events(stmt)
+            for key, action, cascade in events:
+                key = lookup(key)
+                entry = live.get(key)
+
+                if action == "alter":
+                    # Fold USING/WITH CHECK/TO rewrites into the policy, recreated where the ALTER ran
+                    merged = None
+                    if entry is not None and self._safe(key, entry["create"], idx, set(entry["attrs"])):
+                        base = self.rewritten.get(entry["create"], self.statements[entry["create"]][1])
+                        merged = merge_policy(base.text, stmt.text)
+                    if merged is not None:
+                        self.removed[entry["create"]] = f"folded into line {stmt.line}"
+                        self.rewritten[idx] = Statement(merged, stmt.line)
+                        for attr in entry["attrs"]:
+                            self.anchor[attr] = idx
+                        live[key] = {"create": idx, "attrs": entry["attrs"]}
+                        self.folded.append(f"altered {_key_label(key)}")
+                        continue
+                    action = "attr"
+
+                if action == "attr":
+                    if entry is not None:
+                        entry["attrs"].append(idx)
+                    continue
+
+                if action in ("create", "replace"):
+                    attrs = []
+                    if entry is not None and action == "replace":
+                        skip = set(entry["attrs"])
+                        if self._safe(key, entry["create"], idx, skip):
+                            self.removed[entry["create"]] = f"superseded by line {stmt.line}"
+                            # GRANT/COMMENT/ALTER on the old version still apply; replay them after the new one
+                            for attr in entry["attrs"]:
+                                self.anchor[attr] = idx
+                            attrs = entry["attrs"]
+                            self.folded.append(f"superseded {_key_label(key)}")
+                    live[key] = {"create": idx, "attrs": attrs}
+                    continue
+
+                # drop
+                live.pop(key, None)
+                if entry is None or cascade or len(events) > 1:
+                    continue
+                skip = set(entry["attrs"])
+                if self._safe(key, entry["create"], idx, skip):
+                    self.removed[entry["create"]] = f"dropped at line {stmt.line}"
+                    self.removed[idx] = "drop of squashed object"
+                    for attr in entry["attrs"]:
+                        self.removed[attr] = "attribute of squashed object"
+                    self.folded.append(f"create+drop {_key_label(key)}")
+        return self
+
+    def ordered(self) -> list[tuple[Path, Statement]]:
+        moved: dict[int, list[int]] = {}
+        for attr, anchor in self.anchor.items():
+            while anchor in self.anchor:
+                anchor = self.anchor[anchor]
+            moved.setdefault(anchor, []).append(attr)
+        out = []
+        for idx, (path, stmt) in enumerate(self.statements):
+            if idx in self.removed or idx in self.anchor:
+                continue
+            out.append((path, self.rewritten.get(idx, stmt)))
+            for attr in sorted(moved.get(idx, [])):
+                if attr not in self.removed:
+                    out.append(self.statements[attr])
+        return out
+
+
+def select_range(start: str | None, end: str | None) -> list[Path]:
+    files = migration_files()
+    return [
+        f for f in files
+        if (start is None or f.name.split("_")[0] >= start) and (end is None or f.name.split("_")[0] <= end)
+    ]
+
+
+def render(files: list[Path], ordered: list[tuple[Path, Statement]], plan: SquashPlan) -> str:
+    kept = len(ordered)
+    total = len(plan.statements)
+    lines = [
+        "-- " + "=" * 77,
+        "-- LEKBANKEN SQUASHED BASELINE",
+        f"-- Folds {len(files)} migrations: {files[0].name} … {files[-1].name}",
+        f"-- Statements: {total} → {kept} ({len(plan.folded)} folded objects)",
+        "-- Generated by scripts/legacy/squash_migrations.py — do not edit by hand",
+        "-- " + "=" * 77,
+        "",
+    ]
+    current = None
+    for path, stmt in ordered:
+        if path != current:
+            lines.append(f"\n-- ── from {path.name} ──")
+            current = path
+        lines.append(join_statements([stmt]).rstrip("\n"))
+    return "\n".join(lines) + "\n"
+
+
+CATALOG_SQL = """
+WITH user_ns AS (
+  SELECT oid, nspname FROM pg_namespace
+   WHERE nspname NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
+     AND nspname NOT LIKE 'pg_temp%' AND nspname NOT LIKE 'pg_toast_temp%'
+)
+SELECT 'column', n.nspname || '.' || c.relname || '.' || a.attname,
+       format_type(a.atttypid, a.atttypmod) || ' notnull=' || a.attnotnull
+       || ' default=' || coalesce(pg_get_expr(d.adbin, d.adrelid), '')
+  FROM pg_attribute a
+  JOIN pg_class c ON c.oid = a.attrelid
+  JOIN user_ns n ON n.oid = c.relnamespace
+  LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+ WHERE c.relkind IN ('r', 'p', 'v', 'm') AND a.attnum > 0 AND NOT a.attisdropped
+UNION ALL
+SELECT 'table', n.nspname || '.' || c.relname,
+       'kind=' || c.relkind || ' rls=' || c.relrowsecurity || ' force=' || c.relforcerowsecurity
+       || ' acl=' || coalesce(c.relacl::text, '')
+  FROM pg_class c JOIN user_ns n ON n.oid = c.relnamespace
+ WHERE c.relkind IN ('r', 'p', 'v', 'm', 'S')
+UNION ALL
+SELECT 'index', n.nspname || '.' || c.relname, pg_get_indexdef(c.oid)
+  FROM pg_class c JOIN user_ns n ON n.oid = c.relnamespace
+ WHERE c.relkind IN ('i', 'I')
+UNION ALL
+SELECT 'constraint', n.nspname || '.' || t.relname || '.' || con.conname, pg_get_constraintdef(con.oid)
+  FROM pg_constraint con
+  JOIN pg_class t ON t.oid = con.conrelid
+  JOIN user_ns n ON n.oid = t.relnamespace
+UNION ALL
+SELECT 'policy', p.schemaname || '.' || p.tablename || '.' || p.policyname,
+       p.permissive || ' ' || p.cmd || ' ' || p.roles::text
+       || ' using=' || coalesce(p.qual, '') || ' check=' || coalesce(p.with_check, '')
+  FROM pg_policies p
+UNION ALL
+SELECT 'function', p.oid::regprocedure::text,
+       md5(pg_get_functiondef(p.oid)) || ' acl=' || coalesce(p.proacl::text, '')
+  FROM pg_proc p JOIN user_ns n ON n.oid = p.pronamespace
+ WHERE p.prokind IN ('f', 'p')
+   AND NOT EXISTS (SELECT 1 FROM pg_depend dep WHERE dep.objid = p.oid AND dep.deptype = 'e')
+UNION ALL
+SELECT 'trigger', n.nspname || '.' || c.relname || '.' || t.tgname, pg_get_triggerdef(t.oid)
+  FROM pg_trigger t
+  JOIN pg_class c ON c.oid = t.tgrelid
+  JOIN user_ns n ON n.oid = c.relnamespace
+ WHERE NOT t.tgisinternal
+UNION ALL
+SELECT 'view', n.nspname || '.' || c.relname, md5(pg_get_viewdef(c.oid))
+  FROM pg_class c JOIN user_ns n ON n.oid = c.relnamespace
+ WHERE c.relkind IN ('v', 'm')
+UNION ALL
+SELECT 'enum', n.nspname || '.' || t.typname, string_agg(e.enumlabel, ',' ORDER BY e.enumsortorder)
+  FROM pg_type t
+  JOIN user_ns n ON n.oid = t.typnamespace
+  JOIN pg_enum e ON e.enumtypid = t.oid
+ GROUP BY n.nspname, t.typname
+"""
+
+
+def _apply(db_url: str, sql_files: list[Path]) -> float:
+    started = time.perf_counter()
+    for path in sql_files:
+        result = subprocess.run(
+            ["psql", db_url, "-X", "-q", "-v", "ON_ERROR_STOP=1", "-f", str(path)],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"{path.name}: {result.stderr.strip()[:500]}")
+    return time.perf_counter() - started
+
+
+def verify(admin_url: str, template: str | None, prefix: list[Path], files: list[Path], squashed: Path) -> bool:
+    """Apply original and squashed migrations to scratch databases and diff their catalogs"""
+    template = base_template(admin_url, template)
+    print(f"\n🧱 Scratch databases start from template {template}")
+    snapshots = {}
+    timings = {}
+    for name, to_apply in ((ORIGINAL_DB, files), (CANDIDATE_DB, [squashed])):
+        db_url = recreate_database(admin_url, name, template)
+        try:
+            _apply(db_url, prefix)
+            timings[name] = _apply(db_url, to_apply)
+            snapshots[name] = {(r[0], r[1]): r[2] if len(r) > 2 else "" for r in psql_rows(db_url, CATALOG_SQL)}
+        finally:
+            drop_database(admin_url, name)
+
+    original, candidate = snapshots[ORIGINAL_DB], snapshots[CANDIDATE_DB]
+    differences = []
+    for key in sorted(set(original) | set(candidate)):
+        before, after = original.get(key), candidate.get(key)
+        if before != after:
+            differences.append((key, before, after))
+
+    print(f"\n🔬 Catalog diff: {len(original)} objects in original, {len(candidate)} in squashed")
+    print(f"   ⏱️ Apply time: original {timings[ORIGINAL_DB]:.1f}s, squashed {timings[CANDIDATE_DB]:.1f}s")
+    for (kind, name), before, after in differences[:50]:
+        if before is None:
+            print(f"   + {kind} {name}: only in squashed")
+        elif after is None:
+            print(f"   - {kind} {name}: only in original")
+        else:
+            print(f"   ~ {kind} {name}:\n       original: {before[:160]}\n       squashed: {after[:160]}")
+    if len(differences) > 50:
+        print(f"   … and {len(differences) - 50} more")
+    return not differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold a range of migrations into one baseline")
+    parser.add_argument("--from", dest="start", help="First migration version to fold (default: the first file)")
+    parser.add_argument("--to", dest="end", help="Last migration version to fold (default: the last file)")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT,
+                        help="Where to write the squashed SQL (default: supabase/squashed_baseline.sql)")
+    parser.add_argument("--verify", action="store_true", help="Apply both versions locally and diff the catalogs")
+    parser.add_argument("--db-url", default=os.getenv("DATABASE_URL", LOCAL_DB_URL), help="Admin URL for --verify")
+    parser.add_argument("--base-template",
+                        help="Database both scratch copies start from; must have the Supabase schemas "
+                             "(default: build lekbanken_supabase_base from the local stack)")
+    parser.add_argument("--explain", action="store_true", help="List every folded object")
+    args = parser.parse_args()
+
+    files = select_range(args.start, args.end)
+    if not files:
+        print("❌ No migration files in range")
+        sys.exit(1)
+
+    statements = [(path, stmt) for path in files for stmt in cached_statements(path)]
+    plan = SquashPlan(statements).build()
+    ordered = plan.ordered()
+
+    output = args.output
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(render(files, ordered, plan), encoding="utf-8")
+
+    print(f"\n🗜️  Squashed {len(files)} migration(s): {len(statements)} → {len(ordered)} statements")
+    print(f"   📝 {len(plan.folded)} object(s) folded, written to {output}")
+    if args.explain:
+        for entry in plan.folded:
+            print(f"      • {entry}")
+
+    if args.verify:
+        prefix = [f for f in migration_files() if f.name.split("_")[0] < files[0].name.split("_")[0]]
+        try:
+            equivalent = verify(args.db_url, args.base_template, prefix, files, output)
+        except (RuntimeError, FileNotFoundError) as e:
+            print(f"❌ Verification failed to run: {e}")
+            sys.exit(1)
+        if not equivalent:
+            print("\n❌ Squashed baseline is NOT equivalent — do not replace the migrations")
+            sys.exit(1)
+        print("\n✅ Catalogs match — squashed baseline is equivalent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Tests for the lock and rewrite-risk analyzer
+Table-driven checks of how statements and ALTER TABLE actions are classified,
+how a file's findings interact, and how findings are scored.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analyze_migrations import (  # noqa: E402
+    DML,
+    INSTANT,
+    REWRITE,
+    SCAN,
+    TX_COMMIT_BEFORE_USE,
+    TX_NEVER,
+    TX_OK,
+    StatementRisk,
+    _alter_table_action,
+    analyze_file,
+    classify,
+    score,
+)
+from migration_sql import Statement, split_statements  # noqa: E402
+
+MIGRATION = Path("20260101000000_test.sql")
+
+
+class AlterTableActionTest(unittest.TestCase):
+    cases = [
+        ("ADD COLUMN note text", "AccessExclusiveLock", INSTANT),
+        ("ADD COLUMN n int DEFAULT 0", "AccessExclusiveLock", INSTANT),
+        ("ADD COLUMN id uuid DEFAULT gen_random_uuid()", "AccessExclusiveLock", REWRITE),
+        ("ADD COLUMN seen_at timestamptz DEFAULT clock_timestamp()", "AccessExclusiveLock", REWRITE),
+        ("ADD COLUMN total int GENERATED ALWAYS AS (a + b) STORED", "AccessExclusiveLock", REWRITE),
+        ("ADD COLUMN code text UNIQUE", "AccessExclusiveLock", SCAN),
+        ("ALTER COLUMN owner SET NOT NULL", "AccessExclusiveLock", SCAN),
+        ("ALTER COLUMN owner TYPE bigint", "AccessExclusiveLock", REWRITE),
+        ("ALTER COLUMN owner SET DATA TYPE bigint", "AccessExclusiveLock", REWRITE),
+        ("ADD CONSTRAINT items_owner_fk FOREIGN KEY (owner) REFERENCES users (id)", "ShareRowExclusiveLock", SCAN),
+        ("ADD CONSTRAINT items_owner_fk FOREIGN KEY (owner) REFERENCES users (id) NOT VALID",
+         "ShareRowExclusiveLock", INSTANT),
+        ("ADD CONSTRAINT items_qty_check CHECK (qty > 0) NOT VALID", "AccessExclusiveLock", INSTANT),
+        ("ADD CONSTRAINT items_qty_check CHECK (qty > 0)", "AccessExclusiveLock", SCAN),
+        ("ADD CONSTRAINT items_pkey PRIMARY KEY USING INDEX items_id_idx", "AccessExclusiveLock", INSTANT),
+        ("VALIDATE CONSTRAINT items_qty_check", "ShareUpdateExclusiveLock", SCAN),
+        ("ENABLE ROW LEVEL SECURITY", "AccessExclusiveLock", INSTANT),
+        ("SET (fillfactor = 70)", "ShareUpdateExclusiveLock", INSTANT),
+        ("SET UNLOGGED", "AccessExclusiveLock", REWRITE),
+        ("DISABLE TRIGGER items_audit", "ShareRowExclusiveLock", INSTANT),
+    ]
+
+    def test_cases(self):
+        for action, lock, work in self.cases:
+            with self.subTest(action):
+                self.assertEqual(_alter_table_action(action)[:2], (lock, work))
+
+
+class ClassifyTest(unittest.TestCase):
+    # (statement, kind, target, lock, work, transactional)
+    cases = [
+        ("ALTER TABLE public.items ADD COLUMN id2 uuid DEFAULT gen_random_uuid()",
+         "alter table: add column with volatile/stored value", "public.items", "AccessExclusiveLock", REWRITE, TX_OK),
+        ("ALTER TABLE items ALTER COLUMN owner SET NOT NULL",
+         "alter table: set not null", "public.items", "AccessExclusiveLock", SCAN, TX_OK),
+        ("ALTER TABLE items ADD COLUMN a text, ALTER COLUMN owner TYPE bigint",
+         "alter table: change column type", "public.items", "AccessExclusiveLock", REWRITE, TX_OK),
+        ("ALTER TABLE items ADD CONSTRAINT items_qty_check CHECK (qty > 0) NOT VALID",
+         "alter table: add constraint (no validation)", "public.items", "AccessExclusiveLock", INSTANT, TX_OK),
+        ("ALTER TABLE items RENAME COLUMN a TO b", "alter table: rename", "public.items", "AccessExclusiveLock", INSTANT,
+         TX_OK),
+        ("CREATE INDEX CONCURRENTLY items_owner_idx ON public.items (owner)",
+         "create index concurrently", "public.items", "ShareUpdateExclusiveLock", SCAN, TX_NEVER),
+        ("CREATE INDEX items_owner_idx ON public.items (owner)",
+         "create index", "public.items", "ShareLock", SCAN, TX_OK),
+        ("DROP INDEX CONCURRENTLY public.items_owner_idx",
+         "drop index concurrently", "public.items_owner_idx", "ShareUpdateExclusiveLock", INSTANT, TX_NEVER),
+        ("REINDEX INDEX CONCURRENTLY public.items_owner_idx",
+         "reindex concurrently", "public.items_owner_idx", "ShareUpdateExclusiveLock", SCAN, TX_NEVER),
+        ("VACUUM ANALYZE public.items", "vacuum", None, None, INSTANT, TX_NEVER),
+        ("ALTER TYPE public.status ADD VALUE 'archived'",
+         "alter type add value", "public.status", None, INSTANT, TX_COMMIT_BEFORE_USE),
+        ("ALTER POLICY items_read ON items USING (true)", "alter policy", "public.items", "AccessExclusiveLock",
+         INSTANT, TX_OK),
+        ("UPDATE public.items SET qty = 0", "update", "public.items", "RowExclusiveLock", DML, TX_OK),
+        ("CREATE TABLE public.items (id int)", "create table", "public.items", None, INSTANT, TX_OK),
+        ("REFRESH MATERIALIZED VIEW CONCURRENTLY public.totals",
+         "refresh materialized view", "public.totals", "ExclusiveLock", SCAN, TX_OK),
+        ("GRANT SELECT ON public.items TO anon", "grant select", None, None, INSTANT, TX_OK),
+    ]
+
+    def test_cases(self):
+        for sql, kind, target, lock, work, transactional in self.cases:
+            with self.subTest(sql):
+                [r] = classify(Statement(sql, 1), MIGRATION.name)
+                self.assertEqual((r.kind, r.target, r.lock, r.work, r.transactional),
+                                 (kind, target, lock, work, transactional))
+
+    def test_ddl_inside_do_block(self):
+        sql = """DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'items_owner_idx') THEN
+    CREATE INDEX items_owner_idx ON public.items (owner);
+  END IF;
+  ALTER TABLE public.items ALTER COLUMN owner SET NOT NULL;
+END $$"""
+        risks = classify(Statement(sql, 10), MIGRATION.name)
+        self.assertEqual([(r.kind, r.line, r.work) for r in risks], [
+            ("create index", 13, SCAN),
+            ("alter table: set not null", 15, SCAN),
+        ])
+        self.assertTrue(all("inside DO block" in r.note for r in risks))
+
+    def test_do_block_without_ddl(self):
+        [r] = classify(Statement("DO $$ BEGIN RAISE NOTICE 'hi'; END $$", 1))
+        self.assertEqual((r.kind, r.lock), ("do block", None))
+
+
+class AnalyzeFileTest(unittest.TestCase):
+    def analyze(self, sql: str) -> list[StatementRisk]:
+        return analyze_file(MIGRATION, split_statements(sql))
+
+    def test_new_table_is_exempt(self):
+        risks = self.analyze("""
+CREATE TABLE public.items (id int);
+ALTER TABLE public.items ALTER COLUMN id SET NOT NULL;
+CREATE INDEX items_id_idx ON public.items (id);
+ALTER TABLE public.orders ALTER COLUMN id SET NOT NULL;
+""")
+        self.assertEqual([(r.target, r.lock, r.work) for r in risks], [
+            ("public.items", None, INSTANT),
+            ("public.items", None, INSTANT),
+            ("public.items", None, INSTANT),
+            ("public.orders", "AccessExclusiveLock", SCAN),
+        ])
+        self.assertEqual(risks[1].note, "table created in this migration")
+
+    def test_added_enum_value_used_later_is_flagged(self):
+        risks = self.analyze("""
+ALTER TYPE public.status ADD VALUE 'archived';
+UPDATE public.items SET status = 'archived' WHERE deleted;
+""")
+        add = risks[0]
+        self.assertEqual(add.transactional, TX_COMMIT_BEFORE_USE)
+        self.assertIn("used at line 3", add.note)
+        self.assertEqual(add.score, 100.0)
+
+    def test_added_enum_value_unused_is_not_flagged(self):
+        [add] = self.analyze("ALTER TYPE public.status ADD VALUE 'archived';")
+        self.assertEqual(add.score, 0.0)
+        self.assertIn("cannot be used until the transaction commits", add.note)
+
+
+class ScoreTest(unittest.TestCase):
+    MB = 1024 * 1024
+
+    def risk(self, lock, work, target="public.items") -> StatementRisk:
+        return StatementRisk(MIGRATION.name, 1, "test", target, lock, work)
+
+    def test_cases(self):
+        sizes = {"public.items": (1000, 1023 * self.MB)}
+        cases = [
+            ("no lock", self.risk(None, INSTANT), sizes, 0.0),
+            ("instant catalog change", self.risk("AccessExclusiveLock", INSTANT), sizes, 1.0),
+            ("scan without sizes", self.risk("ShareLock", SCAN), None, 6.0),
+            ("scan of a 1 GB table", self.risk("ShareLock", SCAN), sizes, 66.0),
+            ("rewrite of a 1 GB table", self.risk("AccessExclusiveLock", REWRITE), sizes, 220.0),
+            ("rewrite of an unknown table", self.risk("AccessExclusiveLock", REWRITE, "public.other"), sizes, 20.0),
+            ("dml", self.risk("RowExclusiveLock", DML), sizes, 11.0),
+        ]
+        for name, risk, table_sizes, expected in cases:
+            with self.subTest(name):
+                self.assertAlmostEqual(score(risk, table_sizes), expected)
+
+    def test_keeps_a_higher_flagged_score(self):
+        flagged = self.risk(None, INSTANT)
+        flagged.score = 100.0
+        self.assertEqual(score(flagged, None), 100.0)
+        flagged.lock = "AccessExclusiveLock"
+        self.assertEqual(score(flagged, None), 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Tests for the hot path report
+Builds reports from synthetic snapshots against a schema model parsed from
+small migration files, so no database is needed.
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hot_paths import Snapshot, build_report  # noqa: E402
+from schema_model import ModelCache, load_model  # noqa: E402
+
+
+def snapshot(taken_at: float, functions=None, tables=None, statements=None) -> Snapshot:
+    snap = Snapshot.__new__(Snapshot)
+    snap.taken_at = taken_at
+    snap.functions = functions or {}
+    snap.tables = tables or {}
+    snap.statements = statements or {}
+    return snap
+
+
+class BuildReportTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tmp = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, tmp)
+        migrations = tmp / "migrations"
+        migrations.mkdir()
+        (migrations / "001_create.sql").write_text("""
+CREATE TABLE items (id int PRIMARY KEY, owner uuid);
+ALTER TABLE items ENABLE ROW LEVEL SECURITY;
+CREATE POLICY items_read ON items FOR SELECT USING (owner = auth.uid());
+CREATE FUNCTION item_count(p_owner uuid) RETURNS bigint LANGUAGE sql AS $$ SELECT count(*) FROM items $$;
+""", encoding="utf-8")
+        (migrations / "002_cache_auth.sql").write_text(
+            "alter policy items_read on public.items\n  using (owner = (select auth.uid()));\n", encoding="utf-8"
+        )
+        cls.model = load_model(sorted(migrations.glob("*.sql")), cache=ModelCache(tmp / "cache"))
+
+    def test_policies_point_at_the_altering_migration(self):
+        before = snapshot(0, tables={"public.items": (1, 10, 0, 0, 0)})
+        after = snapshot(60, tables={"public.items": (3, 50, 2, 2, 1)})
+
+        report = build_report(self.model, before, after, top=10)
+
+        table = report["tables"][0]
+        self.assertEqual(table["table"], "public.items")
+        self.assertEqual((table["seq_scans"], table["seq_rows_read"], table["rows_written"]), (2, 40, 1))
+        self.assertEqual(table["defined_at"], "001_create.sql:2")
+        self.assertEqual(table["policies"], [{"name": "items_read", "command": "SELECT", "defined_at": "002_cache_auth.sql:1"}])
+
+    def test_statement_tables_carry_the_altered_policy(self):
+        query = "SELECT * FROM public.items WHERE id = $1"
+        after = snapshot(10, statements={"42": (5, 12.5, 5, query)})
+
+        report = build_report(self.model, snapshot(0), after, top=10)
+
+        statement = report["statements"][0]
+        self.assertEqual((statement["calls"], statement["mean_ms"]), (5, 2.5))
+        self.assertEqual(statement["tables"][0]["policies"][0]["defined_at"], "002_cache_auth.sql:1")
+
+    def test_function_overload_fallback_is_marked_approximate(self):
+        after = snapshot(10, functions={
+            "item_count(uuid)": (4, 8.0, 8.0),
+            "item_count(uuid, boolean)": (1, 1.0, 1.0),
+            "untracked()": (1, 1.0, 1.0),
+        })
+
+        functions = {f["function"]: f for f in build_report(self.model, snapshot(0), after, top=10)["functions"]}
+
+        self.assertEqual(functions["item_count(uuid)"]["defined_at"], "001_create.sql:5")
+        self.assertFalse(functions["item_count(uuid)"]["approximate"])
+        self.assertTrue(functions["item_count(uuid, boolean)"]["approximate"])
+        self.assertEqual(functions["untracked()"]["defined_at"], "not defined in migrations")
+        self.assertFalse(functions["untracked()"]["approximate"])
+
+    def test_reset_counters_use_the_after_values(self):
+        before = snapshot(0, functions={"item_count(uuid)": (100, 50.0, 50.0)})
+        after = snapshot(10, functions={"item_count(uuid)": (3, 1.5, 1.5)})
+
+        report = build_report(self.model, before, after, top=10)
+
+        self.assertEqual(report["functions"][0]["calls"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
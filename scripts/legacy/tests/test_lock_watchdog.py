@@ -0,0 +1,105 @@
+"""
+Tests for the lock watchdog
+Drives _report and _maybe_cancel with synthetic blocking edges and a fake
+clock, so no database or psql session is needed.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lock_watchdog import MIGRATION_APP_NAME, BlockingEdge, LockWatchdog  # noqa: E402
+
+
+def app_waits(pid: int, seconds: int = 3) -> BlockingEdge:
+    return BlockingEdge(pid, "postgrest", 100, MIGRATION_APP_NAME, seconds, "select * from items")
+
+
+class WatchdogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.logged = []
+        self.queries = []
+        self.watchdog = LockWatchdog(["psql"], env={}, cancel_waiters=2, cancel_after=5, log=self.logged.append)
+        self.watchdog._query = lambda sql: self.queries.append(sql) or []
+        self.now = 1000.0
+        patcher = mock.patch("lock_watchdog.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tick(self, waiters: int, seconds: float = 1.0):
+        self.watchdog._maybe_cancel(waiters)
+        self.now += seconds
+
+
+class MaybeCancelTest(WatchdogTestCase):
+    def test_cancels_after_threshold_held_for_duration(self):
+        for _ in range(5):
+            self.tick(2)
+        self.assertFalse(self.watchdog.cancelled)
+        self.tick(3)
+        self.assertTrue(self.watchdog.cancelled)
+        self.assertEqual(len(self.queries), 1)
+        self.assertIn("pg_cancel_backend", self.queries[0])
+
+    def test_dip_below_threshold_resets_the_timer(self):
+        for _ in range(4):
+            self.tick(2)
+        self.tick(1)
+        for _ in range(4):
+            self.tick(2)
+        self.assertFalse(self.watchdog.cancelled)
+        self.tick(2)
+        self.tick(2)
+        self.assertTrue(self.watchdog.cancelled)
+
+    def test_cancels_only_once(self):
+        for _ in range(10):
+            self.tick(5)
+        self.assertEqual(len(self.queries), 1)
+
+    def test_disabled_without_cancel_waiters(self):
+        self.watchdog.cancel_waiters = None
+        for _ in range(20):
+            self.tick(50)
+        self.assertFalse(self.watchdog.cancelled)
+        self.assertEqual(self.queries, [])
+
+
+class ReportTest(WatchdogTestCase):
+    locks = [["100", "AccessExclusiveLock", "t", "public.items"]]
+
+    def test_counts_distinct_app_waiters(self):
+        edges = [app_waits(1), app_waits(1), app_waits(2)]
+        self.assertEqual(self.watchdog._report(edges, self.locks), 2)
+        self.assertEqual(self.watchdog.max_waiters, 2)
+        self.assertIn("2 app session(s) waiting on migration locks [AccessExclusiveLock on public.items]", self.logged[0])
+
+    def test_logs_only_when_the_graph_changes(self):
+        self.watchdog._report([app_waits(1)], self.locks)
+        self.watchdog._report([app_waits(1, seconds=9)], self.locks)
+        self.assertEqual(len(self.logged), 1)
+        self.watchdog._report([app_waits(1), app_waits(2)], self.locks)
+        self.assertEqual(len(self.logged), 2)
+
+    def test_migration_waiting_on_app_is_reported_but_not_counted(self):
+        edge = BlockingEdge(100, MIGRATION_APP_NAME, 7, "psql", 4, "alter table items add column x int")
+        self.assertEqual(self.watchdog._report([edge], [["100", "AccessExclusiveLock", "f", "public.items"]]), 0)
+        self.assertIn("pid 100 (lekbanken-migration) waits on pid 7 (psql)", self.logged[0])
+        self.assertIn("(waiting)", self.logged[0])
+
+    def test_unrelated_edges_are_ignored(self):
+        edge = BlockingEdge(5, "worker", 6, "postgrest", 1, "update jobs")
+        self.assertEqual(self.watchdog._report([edge], []), 0)
+        self.assertEqual(self.logged, [])
+
+    def test_max_waiters_keeps_the_peak(self):
+        self.watchdog._report([app_waits(1), app_waits(2), app_waits(3)], self.locks)
+        self.watchdog._report([app_waits(1)], self.locks)
+        self.assertEqual(self.watchdog.max_waiters, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+Tests for the cached schema model
+Parses small migration files written to a temporary directory, with the
+parse cache pointed at another temporary directory.
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from schema_model import ModelCache, load_model, parser_key, statement_events  # noqa: E402
+
+
+class ModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.migrations = self.tmp / "migrations"
+        self.migrations.mkdir()
+        self.cache = ModelCache(self.tmp / "cache")
+
+    def write(self, name: str, sql: str) -> Path:
+        path = self.migrations / name
+        path.write_text(sql, encoding="utf-8")
+        return path
+
+    def model(self):
+        return load_model(sorted(self.migrations.glob("*.sql")), cache=self.cache)
+
+
+class PolicyEventsTest(unittest.TestCase):
+    def test_alter_policy(self):
+        self.assertEqual(
+            statement_events("alter policy p on public.t using (true)", 4),
+            [("alter_policy", "public.t", "p", None, 4)],
+        )
+
+    def test_alter_policy_roles(self):
+        self.assertEqual(
+            statement_events("ALTER POLICY p ON t TO authenticated, anon USING (x) WITH CHECK (y)", 1),
+            [("alter_policy", "public.t", "p", "authenticated, anon", 1)],
+        )
+
+    def test_rename_policy(self):
+        self.assertEqual(
+            statement_events('ALTER POLICY "Old name" ON app.t RENAME TO new_name', 1),
+            [("rename_policy", "app.t", "Old name", "new_name")],
+        )
+
+
+class PolicyModelTest(ModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("001_create.sql", """
+CREATE TABLE items (id int PRIMARY KEY, owner uuid);
+CREATE POLICY items_read ON items FOR SELECT TO authenticated USING (owner = auth.uid());
+""")
+
+    def test_alter_policy_moves_definition(self):
+        self.write("002_tune.sql", "\n\nalter policy items_read on public.items\n  to anon\n  using ((select auth.uid()) = owner);\n")
+        policy = self.model().policies[("public.items", "items_read")]
+        self.assertEqual((policy.file, policy.line), ("002_tune.sql", 3))
+        self.assertEqual(policy.roles, "anon")
+        self.assertEqual(policy.command, "SELECT")
+
+    def test_alter_policy_inside_do_block(self):
+        self.write("002_tune.sql", """DO $$
+BEGIN
+  ALTER POLICY items_read ON public.items USING (true);
+END $$;
+""")
+        policy = self.model().policies[("public.items", "items_read")]
+        self.assertEqual((policy.file, policy.line), ("002_tune.sql", 3))
+        self.assertEqual(policy.roles, "authenticated")
+
+    def test_rename_policy(self):
+        self.write("002_rename.sql", "ALTER POLICY items_read ON items RENAME TO items_select;\n")
+        model = self.model()
+        self.assertNotIn(("public.items", "items_read"), model.policies)
+        policy = model.policies[("public.items", "items_select")]
+        self.assertEqual((policy.name, policy.file), ("items_select", "001_create.sql"))
+
+
+class RenameTableTest(ModelTestCase):
+    def test_dependent_objects_follow_the_table(self):
+        self.write("001_create.sql", """
+CREATE TABLE old_items (id int PRIMARY KEY);
+CREATE INDEX old_items_id_idx ON old_items (id);
+CREATE POLICY old_items_read ON old_items FOR SELECT USING (true);
+CREATE TRIGGER old_items_touch BEFORE UPDATE ON old_items FOR EACH ROW EXECUTE FUNCTION touch();
+""")
+        self.write("002_rename.sql", "ALTER TABLE old_items RENAME TO items;\n")
+        model = self.model()
+
+        self.assertEqual(list(model.tables), ["public.items"])
+        self.assertEqual([p.name for p in model.policies_on("public.items")], ["old_items_read"])
+        self.assertEqual(model.policies_on("public.old_items"), [])
+        self.assertEqual(model.policies_on("public.items")[0].table, "public.items")
+        self.assertEqual([t.name for t in model.triggers_on("public.items")], ["old_items_touch"])
+        self.assertEqual(model.triggers_on("public.items")[0].table, "public.items")
+        self.assertEqual(model.indexes["public.old_items_id_idx"].table, "public.items")
+
+
+class CacheTest(ModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("001_create.sql", "CREATE TABLE items (id int);\n")
+        self.write("002_policy.sql", "CREATE POLICY items_read ON items FOR SELECT USING (true);\n")
+
+    def fresh_model(self, key: str | None = None):
+        self.cache = ModelCache(self.tmp / "cache", key)
+        return self.model()
+
+    def test_cold_then_warm_load(self):
+        cold = self.fresh_model()
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+        warm = self.fresh_model()
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 0))
+        self.assertEqual(list(warm.policies), list(cold.policies))
+
+    def test_edited_file_is_reparsed(self):
+        self.fresh_model()
+        self.write("002_policy.sql", "CREATE POLICY items_write ON items FOR INSERT WITH CHECK (true);\n")
+
+        model = self.fresh_model()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(list(model.policies), [("public.items", "items_write")])
+
+    def test_other_parser_version_does_not_share_entries(self):
+        self.fresh_model(key="parser-a")
+        self.fresh_model(key="parser-b")
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.fresh_model(key="parser-a")
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 0))
+
+    def test_parser_key_follows_the_source(self):
+        self.assertEqual(ModelCache(self.tmp / "cache").key, parser_key())
+        self.assertRegex(parser_key(), r"^[0-9a-f]{12}$")
+
+    def test_unreadable_entries_are_cache_misses(self):
+        self.fresh_model()
+        for entry in (self.tmp / "cache").glob("*.pickle"):
+            # A pickle of the wrong shape, and garbage for the index
+            entry.write_bytes(b"\x80\x04K\x01." if entry.name.startswith("index-") else b"\x80\x04N.")
+
+        model = self.fresh_model()
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertEqual(list(model.policies), [("public.items", "items_read")])
+
+        self.fresh_model()
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 0))
+
+
+class RepositoryMigrationsTest(unittest.TestCase):
+    def test_performance_tuned_policy_points_at_its_migration(self):
+        cache_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, cache_dir)
+        model = load_model(cache=ModelCache(cache_dir))
+        policy = model.policies.get(
+            ("public.tenant_entitlement_seat_assignments", "tenant_entitlement_seat_assignments_manage")
+        )
+        if policy is None:
+            self.skipTest("policy is no longer in the migrations")
+        self.assertNotEqual(policy.file, "00000000000000_baseline.sql")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,365 @@
+"""
+Tests for the HTTP migration backend
+Runs sql_http.py and migrate-rest.py against the local stand-in endpoint
+(sql_http_standin.py) backed by a scratch database on local Postgres. The
+database tests skip when psql or the server is not available; set
+TEST_DATABASE_URL to use a server other than the local Supabase one.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from migration_sql import (  # noqa: E402
+    LOCAL_DB_URL,
+    MIGRATIONS_DIR,
+    drop_database,
+    psql_rows,
+    read_statements,
+    recreate_database,
+    split_statements,
+)
+from sql_http import (  # noqa: E402
+    DEFAULT_MAX_BATCH_BYTES,
+    SqlHttpClient,
+    SqlOutcomeUnknown,
+    describe_batches,
+    execute_file,
+    plan_requests,
+)
+from sql_http_standin import StandinStats, make_handler  # noqa: E402
+
+ADMIN_URL = os.getenv("TEST_DATABASE_URL", LOCAL_DB_URL)
+TEST_DB = "lekbanken_sqlhttp_test"
+TOKEN = "test-token"
+
+
+def _serve(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _endpoint(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/v1/projects/local/database/query"
+
+
+def _write(directory: Path, name: str, sql: str) -> Path:
+    path = directory / name
+    path.write_text(sql, encoding="utf-8")
+    return path
+
+
+class BatchingTest(unittest.TestCase):
+    def test_baseline_is_split_on_statement_boundaries(self):
+        baseline = MIGRATIONS_DIR / "00000000000000_baseline.sql"
+        statements = read_statements(baseline)
+        batches = describe_batches(statements, DEFAULT_MAX_BATCH_BYTES)
+
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(sum(count for count, _ in batches), len(statements))
+        for count, size in batches:
+            self.assertTrue(size <= DEFAULT_MAX_BATCH_BYTES or count == 1, (count, size))
+
+    def test_statements_outside_transactions_are_sent_alone(self):
+        statements = split_statements("""
+            CREATE TABLE t (id int);
+            CREATE INDEX CONCURRENTLY t_id_idx ON t (id);
+            INSERT INTO t VALUES (1);
+            VACUUM t;
+            SELECT 1;
+        """)
+        batches = plan_requests(statements, DEFAULT_MAX_BATCH_BYTES)
+        self.assertEqual([[s.text.split()[0] for s in b] for b in batches],
+                         [["CREATE"], ["CREATE"], ["INSERT"], ["VACUUM"], ["SELECT"]])
+
+    def test_request_ends_after_enum_add_value(self):
+        statements = split_statements("""
+            CREATE TYPE state AS ENUM ('new');
+            ALTER TYPE state ADD VALUE 'done';
+            CREATE TABLE jobs (s state DEFAULT 'done');
+            CREATE TABLE other (id int);
+        """)
+        batches = plan_requests(statements, DEFAULT_MAX_BATCH_BYTES)
+        self.assertEqual([len(b) for b in batches], [2, 2])
+        self.assertTrue(batches[0][-1].text.startswith("ALTER TYPE"))
+
+
+class ConnectionFailureTest(unittest.TestCase):
+    """Failure modes that need no database"""
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.file = _write(self.tmp, "001_one.sql", "select 1;\n")
+
+    def _server(self, do_post) -> tuple[ThreadingHTTPServer, list]:
+        seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                seen.append(body)
+                do_post(self)
+
+        server = _serve(Handler)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, seen
+
+    def test_dropped_response_is_outcome_unknown_and_not_resent(self):
+        def drop(handler):
+            handler.close_connection = True
+            handler.connection.shutdown(2)
+
+        server, seen = self._server(drop)
+        with SqlHttpClient(_endpoint(server), TOKEN) as client:
+            with self.assertRaises(SqlOutcomeUnknown):
+                client.execute("create table once_only (id int)")
+        self.assertEqual(len(seen), 1)
+
+    def test_non_json_success_body_is_a_failed_result(self):
+        def html(handler):
+            body = b"<html>proxy login</html>"
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/html")
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        server, _ = self._server(html)
+        with SqlHttpClient(_endpoint(server), TOKEN) as client:
+            result = execute_file(client, self.file)
+        self.assertFalse(result.ok)
+        self.assertIn("batch 1/1", result.error)
+
+    def test_version_row_is_sent_with_the_last_batch(self):
+        def ok(handler):
+            handler.send_response(201)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", "2")
+            handler.end_headers()
+            handler.wfile.write(b"[]")
+
+        path = _write(self.tmp, "20260101000000_add_things.sql", "create table a (id int);\ncreate table b (id int);\n")
+        server, seen = self._server(ok)
+        with SqlHttpClient(_endpoint(server), TOKEN, use_gzip=False) as client:
+            result = execute_file(client, path, max_batch_bytes=30, record_version=True)
+
+        self.assertTrue(result.ok, result.error)
+        queries = [json.loads(body)["query"] for body in seen]
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("schema_migrations", queries[0])
+        self.assertIn("create table b", queries[1])
+        self.assertIn("INSERT INTO supabase_migrations.schema_migrations (version, name, statements) "
+                      "VALUES ('20260101000000', 'add_things'", queries[1])
+
+    def test_refused_connection_is_a_failed_result(self):
+        server = _serve(BaseHTTPRequestHandler)
+        endpoint = _endpoint(server)
+        server.shutdown()
+        server.server_close()
+
+        with SqlHttpClient(endpoint, TOKEN, timeout=5) as client:
+            result = execute_file(client, self.file)
+        self.assertFalse(result.ok)
+        self.assertIn("ConnectionRefusedError", result.error)
+
+
+@unittest.skipUnless(shutil.which("psql"), "psql is not installed")
+class StandinTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.db_url = recreate_database(ADMIN_URL, TEST_DB)
+        except RuntimeError as e:
+            raise unittest.SkipTest(f"local Postgres is not available: {e}")
+
+    @classmethod
+    def tearDownClass(cls):
+        drop_database(ADMIN_URL, TEST_DB)
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        # Every test starts with an empty migration history
+        psql_rows(self.db_url, "DROP SCHEMA IF EXISTS supabase_migrations CASCADE")
+
+    def _standin(self, accept_gzip: bool = True) -> tuple[str, StandinStats]:
+        stats = StandinStats()
+        server = _serve(make_handler(self.db_url, TOKEN, stats, accept_gzip=accept_gzip))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return _endpoint(server), stats
+
+    def _exists(self, regclass: str) -> bool:
+        return psql_rows(self.db_url, f"SELECT to_regclass('{regclass}') IS NOT NULL")[0][0] == "t"
+
+    def test_execute_file_batches_over_one_gzip_connection(self):
+        path = _write(self.tmp, "001_objects.sql", """
+            CREATE TABLE batched_items (id int PRIMARY KEY, label text NOT NULL);
+            CREATE INDEX batched_items_label_idx ON batched_items (label);
+            CREATE FUNCTION batched_label(p_id int) RETURNS text LANGUAGE sql AS $$
+              SELECT label FROM batched_items WHERE id = p_id; -- semicolon inside the body
+            $$;
+            INSERT INTO batched_items VALUES (1, 'it''s; fine');
+        """)
+        endpoint, stats = self._standin()
+
+        with SqlHttpClient(endpoint, TOKEN) as client:
+            result = execute_file(client, path, max_batch_bytes=120)
+
+        self.assertTrue(result.ok, result.error)
+        self.assertGreater(result.batches, 1)
+        self.assertEqual(client.connections_opened, 1)
+        self.assertEqual(stats.connections, 1)
+        self.assertEqual(stats.gzip_requests, result.batches)
+        self.assertTrue(self._exists("public.batched_items_label_idx"))
+        self.assertEqual(psql_rows(self.db_url, "SELECT batched_label(1)"), [["it's; fine"]])
+
+    def test_stops_at_first_failing_batch(self):
+        path = _write(self.tmp, "001_fails.sql", """
+            CREATE TABLE before_failure (id int);
+            INSERT INTO missing_table VALUES (1);
+            CREATE TABLE after_failure (id int);
+        """)
+        endpoint, stats = self._standin()
+
+        with SqlHttpClient(endpoint, TOKEN) as client:
+            result = execute_file(client, path, max_batch_bytes=1)
+
+        self.assertFalse(result.ok)
+        self.assertIn("batch 2/3", result.error)
+        self.assertIn("missing_table", result.error)
+        self.assertEqual(stats.requests, 2)
+        self.assertTrue(self._exists("public.before_failure"))
+        self.assertFalse(self._exists("public.after_failure"))
+
+    def test_falls_back_to_plain_bodies_on_415(self):
+        path = _write(self.tmp, "001_plain.sql", "CREATE TABLE plain_body (id int);\nCREATE TABLE plain_body_2 (id int);\n")
+        endpoint, stats = self._standin(accept_gzip=False)
+
+        with SqlHttpClient(endpoint, TOKEN) as client:
+            result = execute_file(client, path, max_batch_bytes=1)
+            self.assertFalse(client.use_gzip)
+
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(stats.gzip_requests, 0)
+        self.assertEqual(stats.requests, 2)
+        self.assertTrue(self._exists("public.plain_body_2"))
+
+    def test_transaction_restricted_statements(self):
+        path = _write(self.tmp, "001_restricted.sql", """
+            CREATE TYPE job_state AS ENUM ('new');
+            CREATE TABLE jobs (id int, state job_state);
+            ALTER TYPE job_state ADD VALUE 'done';
+            INSERT INTO jobs VALUES (1, 'done');
+            CREATE INDEX CONCURRENTLY jobs_state_idx ON jobs (state);
+            VACUUM jobs;
+        """)
+        endpoint, stats = self._standin()
+
+        with SqlHttpClient(endpoint, TOKEN) as client:
+            result = execute_file(client, path)
+
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(stats.requests, 4)
+        self.assertTrue(self._exists("public.jobs_state_idx"))
+
+    def test_multi_statement_request_is_one_transaction(self):
+        path = _write(self.tmp, "001_atomic.sql", """
+            CREATE TABLE atomic_first (id int);
+            INSERT INTO atomic_missing VALUES (1);
+        """)
+        endpoint, _ = self._standin()
+
+        with SqlHttpClient(endpoint, TOKEN) as client:
+            result = execute_file(client, path)
+
+        self.assertFalse(result.ok)
+        self.assertFalse(self._exists("public.atomic_first"))
+
+    def _migrate_rest(self, migrations: Path, endpoint: str) -> subprocess.CompletedProcess:
+        env = dict(os.environ, SUPABASE_SQL_ENDPOINT=endpoint, SUPABASE_ACCESS_TOKEN=TOKEN)
+        return subprocess.run(
+            [sys.executable, str(SCRIPTS_DIR / "migrate-rest.py"), "--yes", "--migrations-dir", str(migrations)],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+
+    def test_migrate_rest_applies_all_files(self):
+        _write(self.tmp, "20260101000000_first.sql", "CREATE TABLE rest_first (id int);\n")
+        _write(self.tmp, "20260101000001_second.sql", "CREATE TABLE rest_second (id int REFERENCES rest_first);\n")
+        endpoint, stats = self._standin()
+
+        result = self._migrate_rest(self.tmp, endpoint)
+
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertIn("2 succeeded, 0 failed", result.stdout)
+        self.assertIn("1 connection(s) opened", result.stdout)
+        self.assertGreater(stats.gzip_requests, 0)
+        self.assertTrue(self._exists("public.rest_second"))
+
+    def test_migrate_rest_skips_applied_versions(self):
+        _write(self.tmp, "20260101000000_first.sql", "CREATE TABLE twice_first (id int);\n")
+        _write(self.tmp, "20260101000001_second.sql", "CREATE TABLE twice_second (id int);\n")
+        endpoint, _ = self._standin()
+
+        first = self._migrate_rest(self.tmp, endpoint)
+        second = self._migrate_rest(self.tmp, endpoint)
+
+        self.assertEqual(first.returncode, 0, first.stdout + first.stderr)
+        self.assertEqual(second.returncode, 0, second.stdout + second.stderr)
+        self.assertIn("2 already applied, 0 pending", second.stdout)
+        self.assertIn("up to date", second.stdout)
+        versions = psql_rows(self.db_url, "SELECT version, name FROM supabase_migrations.schema_migrations "
+                                          "WHERE version LIKE '20260101%' ORDER BY version")
+        self.assertEqual(versions, [["20260101000000", "first"], ["20260101000001", "second"]])
+
+    def test_migrate_rest_resumes_after_failure(self):
+        _write(self.tmp, "20260102000000_ok.sql", "CREATE TABLE resume_ok (id int);\n")
+        bad = _write(self.tmp, "20260102000001_fix.sql", "ALTER TABLE resume_missing ADD COLUMN x int;\n")
+        _write(self.tmp, "20260102000002_last.sql", "CREATE TABLE resume_last (id int);\n")
+        endpoint, _ = self._standin()
+
+        self.assertEqual(self._migrate_rest(self.tmp, endpoint).returncode, 1)
+        bad.write_text("ALTER TABLE resume_ok ADD COLUMN x int;\n", encoding="utf-8")
+        result = self._migrate_rest(self.tmp, endpoint)
+
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertIn("1 already applied, 2 pending", result.stdout)
+        self.assertTrue(self._exists("public.resume_last"))
+
+    def test_migrate_rest_stops_at_failing_file(self):
+        _write(self.tmp, "20260101000000_ok.sql", "CREATE TABLE rest_ok (id int);\n")
+        _write(self.tmp, "20260101000001_bad.sql", "ALTER TABLE rest_missing ADD COLUMN x int;\n")
+        _write(self.tmp, "20260101000002_never.sql", "CREATE TABLE rest_never (id int);\n")
+        endpoint, _ = self._standin()
+
+        result = self._migrate_rest(self.tmp, endpoint)
+
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("Stopping at migration 2", result.stdout)
+        self.assertTrue(self._exists("public.rest_ok"))
+        self.assertFalse(self._exists("public.rest_never"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+Tests for the squash generator's folding rules
+Builds SquashPlans from inline SQL and checks which statements survive, in
+which order, and when a fold must be refused.
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from migration_sql import split_statements  # noqa: E402
+from squash_migrations import SquashPlan, merge_policy  # noqa: E402
+
+FUNCTION_V1 = "CREATE OR REPLACE FUNCTION public.item_total(p_id int) RETURNS int LANGUAGE sql AS $$ SELECT 1 $$"
+FUNCTION_V2 = "CREATE OR REPLACE FUNCTION public.item_total(p_id int) RETURNS int LANGUAGE sql AS $$ SELECT 2 $$"
+
+
+def squash(sql: str) -> tuple[SquashPlan, list[str]]:
+    path = Path("20260101000000_test.sql")
+    plan = SquashPlan([(path, stmt) for stmt in split_statements(sql)]).build()
+    return plan, [stmt.text for _, stmt in plan.ordered()]
+
+
+class CreateDropTest(unittest.TestCase):
+    def test_policy_created_then_dropped_disappears(self):
+        plan, kept = squash("""
+CREATE POLICY items_tmp_read ON public.items FOR SELECT USING (true);
+CREATE TABLE public.other (id int);
+DROP POLICY items_tmp_read ON public.items;
+""")
+        self.assertEqual(kept, ["CREATE TABLE public.other (id int)"])
+        self.assertEqual(plan.folded, ['create+drop policy "items_tmp_read" on public.items'])
+
+    def test_function_attributes_are_dropped_with_it(self):
+        _, kept = squash(f"""
+{FUNCTION_V1};
+GRANT EXECUTE ON FUNCTION public.item_total(int) TO authenticated;
+COMMENT ON FUNCTION public.item_total(int) IS 'old';
+DROP FUNCTION public.item_total(int);
+""")
+        self.assertEqual(kept, [])
+
+    def test_drop_of_several_objects_is_kept(self):
+        _, kept = squash("""
+CREATE INDEX items_owner_idx ON public.items (owner);
+CREATE INDEX items_kind_idx ON public.items (kind);
+DROP INDEX public.items_owner_idx, public.items_kind_idx;
+""")
+        self.assertEqual(len(kept), 3)
+
+
+class SupersededReplaceTest(unittest.TestCase):
+    def test_grant_is_replayed_after_the_surviving_version(self):
+        plan, kept = squash(f"""
+{FUNCTION_V1};
+GRANT EXECUTE ON FUNCTION public.item_total(int) TO authenticated;
+CREATE TABLE public.other (id int);
+{FUNCTION_V2};
+""")
+        self.assertEqual(kept, [
+            "CREATE TABLE public.other (id int)",
+            FUNCTION_V2,
+            "GRANT EXECUTE ON FUNCTION public.item_total(int) TO authenticated",
+        ])
+        self.assertEqual(plan.folded, ["superseded function public.item_total(integer)"])
+
+    def test_chain_of_replacements_keeps_only_the_last(self):
+        _, kept = squash(f"""
+{FUNCTION_V1};
+GRANT EXECUTE ON FUNCTION public.item_total(int) TO authenticated;
+{FUNCTION_V1.replace("SELECT 1", "SELECT 3")};
+{FUNCTION_V2};
+""")
+        self.assertEqual(kept, [FUNCTION_V2, "GRANT EXECUTE ON FUNCTION public.item_total(int) TO authenticated"])
+
+    def test_other_overloads_are_not_superseded(self):
+        other = FUNCTION_V1.replace("p_id int", "p_id bigint")
+        _, kept = squash(f"{FUNCTION_V1};\n{other};\n")
+        self.assertEqual(kept, [FUNCTION_V1, other])
+
+
+class UnsafeFoldTest(unittest.TestCase):
+    """A statement between the two ends that references the object blocks the fold"""
+
+    cases = [
+        ("replace referenced by a view",
+         f"{FUNCTION_V1};\nCREATE VIEW public.totals AS SELECT public.item_total(1);\n{FUNCTION_V2};"),
+        ("drop after the index is used",
+         "CREATE INDEX items_owner_idx ON public.items (owner);\n"
+         "CLUSTER public.items USING items_owner_idx;\nDROP INDEX public.items_owner_idx;"),
+        ("alter after the policy is referenced",
+         "CREATE POLICY items_read ON public.items FOR SELECT USING (true);\n"
+         "SELECT 'items_read';\nALTER POLICY items_read ON public.items USING (false);"),
+    ]
+
+    def test_cases(self):
+        for name, sql in self.cases:
+            with self.subTest(name):
+                plan, kept = squash(sql)
+                self.assertEqual(kept, [s.text for s in split_statements(sql)])
+                self.assertEqual(plan.folded, [])
+
+
+class CascadeTest(unittest.TestCase):
+    def test_cascade_drop_keeps_both_ends(self):
+        # CASCADE may take dependents the plan does not track, so nothing is folded
+        sql = f"{FUNCTION_V1};\nDROP FUNCTION public.item_total(int) CASCADE;"
+        plan, kept = squash(sql)
+        self.assertEqual(kept, [s.text for s in split_statements(sql)])
+        self.assertEqual(plan.folded, [])
+
+    def test_object_recreated_after_cascade_drop_is_new(self):
+        _, kept = squash(f"{FUNCTION_V1};\nDROP FUNCTION public.item_total(int) CASCADE;\n{FUNCTION_V2};")
+        self.assertEqual(kept[-1], FUNCTION_V2)
+        self.assertEqual(len(kept), 3)
+
+
+class AlterPolicyTest(unittest.TestCase):
+    def test_alter_is_merged_into_the_create(self):
+        plan, kept = squash("""
+CREATE POLICY items_read ON public.items FOR SELECT TO anon USING (true);
+CREATE TABLE public.other (id int);
+ALTER POLICY items_read ON public.items TO authenticated USING (owner = (select auth.uid()));
+""")
+        self.assertEqual(kept, [
+            "CREATE TABLE public.other (id int)",
+            "CREATE POLICY items_read ON public.items\n  FOR SELECT\n  TO authenticated\n"
+            "  USING (owner = (select auth.uid()))",
+        ])
+        self.assertEqual(plan.folded, ['altered policy "items_read" on public.items'])
+
+    def test_merged_policy_can_still_be_dropped(self):
+        _, kept = squash("""
+CREATE POLICY items_read ON public.items FOR SELECT USING (true);
+ALTER POLICY items_read ON public.items USING (false);
+DROP POLICY items_read ON public.items;
+""")
+        self.assertEqual(kept, [])
+
+    def test_rename_is_not_merged(self):
+        sql = ("CREATE POLICY items_read ON public.items FOR SELECT USING (true);\n"
+               "ALTER POLICY items_read ON public.items RENAME TO items_select;")
+        _, kept = squash(sql)
+        self.assertEqual(len(kept), 2)
+
+
+class MergePolicyTest(unittest.TestCase):
+    create = "CREATE POLICY p_items ON public.items AS PERMISSIVE FOR UPDATE TO authenticated USING (true)"
+
+    cases = [
+        ("replaces USING", "ALTER POLICY p_items ON public.items USING (owner = auth.uid())",
+         "CREATE POLICY p_items ON public.items\n  AS PERMISSIVE\n  FOR UPDATE\n  TO authenticated\n"
+         "  USING (owner = auth.uid())"),
+        ("adds WITH CHECK", "ALTER POLICY p_items ON public.items WITH CHECK (owner = auth.uid())",
+         "CREATE POLICY p_items ON public.items\n  AS PERMISSIVE\n  FOR UPDATE\n  TO authenticated\n"
+         "  USING (true)\n  WITH CHECK (owner = auth.uid())"),
+        ("keyword inside an expression", "ALTER POLICY p_items ON public.items USING (kind = 'to do')",
+         "CREATE POLICY p_items ON public.items\n  AS PERMISSIVE\n  FOR UPDATE\n  TO authenticated\n"
+         "  USING (kind = 'to do')"),
+        ("rename", "ALTER POLICY p_items ON public.items RENAME TO p_items_update", None),
+        ("repeated clause", "ALTER POLICY p_items ON public.items USING (true) USING (false)", None),
+        ("not a policy", "ALTER TABLE public.items ENABLE ROW LEVEL SECURITY", None),
+    ]
+
+    def test_cases(self):
+        for name, alter, expected in self.cases:
+            with self.subTest(name):
+                self.assertEqual(merge_policy(self.create, alter), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()